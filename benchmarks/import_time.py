@@ -0,0 +1,96 @@
+"""Reports how long the entry points take to import, per package and slowest module, and checks a startup budget:
+
+    python -m benchmarks.import_time                       # exits with 1 if an entry point is over its budget
+    python -m benchmarks.import_time --budget video_search.api=400 --top 20
+
+Every run imports the module in a fresh interpreter with ``-X importtime``, the median of the runs is reported.
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+# milliseconds of cumulative import time per entry point, about 1.5 times the median measured when they were set so
+# that a busy machine does not fail the check, a new eager import of a heavy dependency still does
+_BUDGETS_MS = {
+    # DemoConfig only, what the CLIs and the API service pay for the package (measured 15 ms)
+    "video_search": 25,
+    # the search without the Streamlit app and without semantha_sdk, which is loaded with the first request (250 ms)
+    "video_search.search.semantha": 400,
+    # the search service without Streamlit (290 ms)
+    "video_search.api": 450,
+    # the Streamlit app as main.py imports it, most of it is Streamlit itself (1450 ms)
+    "video_search.video_search": 2200,
+}
+
+
+def import_times(module: str) -> list:
+    """(module, self µs, cumulative µs, depth) for every module imported by ``import module`` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2))
+    # drop what the interpreter imports at startup (site, encodings), i.e. everything before the entry point's tree
+    starts = [i for i, (_, _, _, depth) in enumerate(times[:-1]) if depth == 0]
+    return times[starts[-1] + 1 if starts else 0:]
+
+
+def profile(module: str, runs: int) -> dict:
+    samples = [import_times(module) for _ in range(runs)]
+    # the entry point is the last module to finish importing
+    totals = [times[-1][2] / 1000 for times in samples]
+    median_run = samples[int(np.argsort(totals)[len(totals) // 2])]
+    packages = defaultdict(int)
+    for name, self_us, _, _ in median_run:
+        packages[name.split(".")[0]] += self_us
+    return {
+        "total_ms": float(np.median(totals)),
+        "packages": sorted(((us / 1000, name) for name, us in packages.items()), reverse=True),
+        "modules": sorted(((cumulative / 1000, name) for name, _, cumulative, _ in median_run), reverse=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the video search entry points.")
+    parser.add_argument("modules", nargs="*", help="Entry points to profile, all budgeted ones by default")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Number of packages and modules to list per entry point")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS",
+                        help="Override or add the budget of an entry point")
+    args = parser.parse_args()
+
+    budgets = dict(_BUDGETS_MS)
+    for budget in args.budget:
+        module, milliseconds = budget.split("=")
+        budgets[module] = float(milliseconds)
+
+    over_budget = []
+    for module in args.modules or list(budgets):
+        result = profile(module, args.runs)
+        budget = budgets.get(module)
+        status = "" if budget is None else f" (budget {budget:.0f} ms)"
+        print(f"{module}: {result['total_ms']:.1f} ms{status}")
+        print("  packages (self time):")
+        for milliseconds, name in result["packages"][:args.top]:
+            print(f"    {milliseconds:8.1f} ms  {name}")
+        print("  modules (cumulative):")
+        for milliseconds, name in result["modules"][:args.top]:
+            print(f"    {milliseconds:8.1f} ms  {name}")
+        if budget is not None and result["total_ms"] > budget:
+            over_budget.append(f"{module}: {result['total_ms']:.1f} ms > {budget:.0f} ms")
+
+    if over_budget:
+        print("Over the startup budget:\n  " + "\n  ".join(over_budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
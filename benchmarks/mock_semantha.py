@@ -0,0 +1,302 @@
+"""Local stand-in for the Semantha endpoints used by video_search.
+
+Serves a generated library over HTTP so that the real semantha_sdk client (and the pooled connection handling)
+can be exercised without a Semantha server:
+
+    python -m benchmarks.mock_semantha --corpus-size 5000 --latency 0.05 --port 8080
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import multiprocessing
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from video_search.search.local_backend import HashingTfidfEmbedder, _matches_tags
+
+_DOMAIN_PATH = re.compile(r"^/api/v3/domains/(?P<domain>[^/]+)/(?P<endpoint>references|referencedocuments)(?:/(?P<id>[^/]+))?$")
+_WORDS = (
+    "data model search video sentence transcript query answer question learning network training language "
+    "vector index library server cache latency window speaker topic lecture example result ranking feature "
+    "signal audio speech text token document domain metric score hybrid dense sparse filter neural system"
+).split()
+
+
+class MockCorpus:
+    """Generated library with ``corpus_size`` sentence windows, grouped into videos of ``windows_per_video``."""
+
+    def __init__(self, corpus_size: int = 2000, windows_per_video: int = 50, window_words: int = 24, seed: int = 0):
+        rng = random.Random(seed)
+        self.documents = {}
+        video_texts = {}
+        for i in range(corpus_size):
+            video_id = f"mock{i // windows_per_video:05d}"
+            start = (i % windows_per_video) * 10
+            text = " ".join(rng.choice(_WORDS) for _ in range(window_words))
+            self.__add(f"s{i}", f"Video {video_id}", text, ["SENTENCE_LEVEL", "CONTROL", "base"], video_id, start)
+            video_texts.setdefault(video_id, []).append(text)
+        for video_id, texts in video_texts.items():
+            self.__add(f"t{video_id}", f"Video {video_id}", " ".join(texts), ["TRANSCRIPT_LEVEL"], video_id, 0)
+        self.__ids = list(self.documents)
+        self.__tags = [set(self.documents[i]["tags"]) for i in self.__ids]
+        self.__embedder = HashingTfidfEmbedder()
+        texts = [self.documents[i]["content"] for i in self.__ids]
+        self.__embedder.fit(texts)
+        self.__vectors = self.__embedder.encode(texts)
+        self.__lock = threading.Lock()
+        # ids of uploaded documents are never reused, like the server's
+        self.__upload_ids = itertools.count()
+
+    def __add(self, document_id, name, content, tags, video_id, start):
+        self.documents[document_id] = {
+            "id": document_id,
+            "name": name,
+            "tags": tags,
+            "metadata": str({"id": f"https://www.youtube.com/watch?v={video_id}&t={start}", "start": start}),
+            "content": content,
+            "contentPreview": content[:200],
+        }
+
+    def sample_queries(self, n: int, seed: int = 1) -> list:
+        rng = random.Random(seed)
+        sentences = [d["content"].split() for d in self.documents.values() if "SENTENCE_LEVEL" in d["tags"]]
+        queries = []
+        for _ in range(n):
+            words = rng.choice(sentences)
+            offset = rng.randrange(0, max(1, len(words) - 8))
+            queries.append(" ".join(words[offset:offset + 8]))
+        return queries
+
+    def references(self, text: str, tags: str, threshold: float = None, max_references: int = 50) -> list:
+        # like the Semantha API, no threshold returns the best matches however similar they are
+        similarities = self.__vectors @ self.__embedder.encode([text])[0]
+        references = []
+        for i in np.argsort(-similarities, kind="stable").tolist():
+            if (threshold is not None and similarities[i] < threshold) or len(references) >= max_references:
+                break
+            if _matches_tags(self.__tags[i], tags):
+                references.append({"documentId": self.__ids[i], "similarity": float(similarities[i]), "color": "NONE"})
+        return references
+
+    def select(self, document_ids=None, tags=None, fields=None) -> list:
+        with self.__lock:
+            documents = list(self.documents.values()) if document_ids is None \
+                else [self.documents[i] for i in document_ids if i in self.documents]
+        documents = [d for d in documents if tags is None or _matches_tags(set(d["tags"]), tags)]
+        if fields is not None:
+            keys = {"contentpreview": "contentPreview"}
+            fields = [keys.get(f, f) for f in fields.split(",")]
+            documents = [{k: d[k] for k in fields if k in d} for d in documents]
+        return documents
+
+    def add(self, name: str, tags: str, metadata: str, content: str) -> dict:
+        with self.__lock:
+            document_id = f"u{next(self.__upload_ids)}"
+            self.documents[document_id] = {
+                "id": document_id,
+                "name": name or "input.txt",
+                "tags": tags.split(",") if tags else [],
+                "metadata": metadata,
+                "content": content,
+                "contentPreview": content[:200],
+            }
+            return self.documents[document_id]
+
+    def delete(self, document_id: str) -> bool:
+        with self.__lock:
+            return self.documents.pop(document_id, None) is not None
+
+
+class MockSemanthaServer:
+    """Serves ``corpus`` on localhost, every request is delayed by ``latency`` seconds (plus up to ``jitter``)."""
+
+    def __init__(self, corpus: MockCorpus, latency: float = 0.02, jitter: float = 0.0, port: int = 0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = Counter()
+        self.__counter_lock = threading.Lock()
+        self.__server = _Server(("127.0.0.1", port), _handler(self))
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str) -> None:
+        with self.__counter_lock:
+            self.requests[endpoint] += 1
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="mock-semantha", daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 makes concurrent clients wait for SYN retransmits
+    request_queue_size = 128
+
+
+def _parse_form(headers, body: bytes) -> dict:
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + headers["Content-Type"].encode() + b"\r\n\r\n" + body
+    )
+    form = {}
+    for part in message.iter_parts():
+        form[part.get_param("name", header="content-disposition")] = part.get_payload(decode=True).decode("utf-8")
+    return form
+
+
+def _handler(server: MockSemanthaServer):
+
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive like the real server, so the client's connection pool is measured as well
+        protocol_version = "HTTP/1.1"
+        # headers and body are separate writes, with Nagle every keep-alive request waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.__handle("GET")
+
+        def do_POST(self):
+            self.__handle("POST")
+
+        def do_DELETE(self):
+            self.__handle("DELETE")
+
+        def __handle(self, method):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if server.latency > 0 or server.jitter > 0:
+                time.sleep(server.latency + random.uniform(0, server.jitter))
+            if method == "GET" and url.path == "/api/v3/currentuser":
+                server.count("currentuser")
+                return self.__reply({"name": "mock", "validUntil": 0, "roles": ["User"]})
+            match = _DOMAIN_PATH.match(url.path)
+            if match is None:
+                return self.__reply({"error": "not found"}, 404)
+            endpoint, document_id = match["endpoint"], match["id"]
+            server.count(f"{method} {endpoint}" + ("/{id}" if document_id else ""))
+            if endpoint == "references" and method == "POST":
+                form = self.__form()
+                references = server.corpus.references(
+                    form.get("file", form.get("text", "")),
+                    form.get("tags", ""),
+                    float(form["similaritythreshold"]) if "similaritythreshold" in form else None,
+                    int(query.get("maxreferences", 50)),
+                )
+                return self.__reply({"references": references})
+            if endpoint == "referencedocuments" and document_id is None and method == "GET":
+                document_ids = query["documentids"].split(",") if "documentids" in query else None
+                documents = server.corpus.select(document_ids, query.get("tags"), query.get("fields"))
+                offset = int(query.get("offset", 0))
+                limit = int(query.get("limit", len(documents)))
+                return self.__reply({
+                    "meta": {"parameters": {"domain": match["domain"]}},
+                    "data": documents[offset:offset + limit],
+                })
+            if endpoint == "referencedocuments" and document_id is None and method == "POST":
+                form = self.__form()
+                document = server.corpus.add(form.get("name"), form.get("tags"), form.get("metadata"),
+                                             form.get("file", form.get("text", "")))
+                return self.__reply([document])
+            if endpoint == "referencedocuments" and method == "GET":
+                documents = server.corpus.select([document_id])
+                return self.__reply(documents[0]) if documents else self.__reply({"error": "not found"}, 404)
+            if endpoint == "referencedocuments" and method == "DELETE":
+                return self.__reply(None, 204 if server.corpus.delete(document_id) else 404)
+            return self.__reply({"error": "not allowed"}, 405)
+
+        def __form(self) -> dict:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            return _parse_form(self.headers, body)
+
+        def __reply(self, payload, status=200):
+            body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _serve(corpus_size, windows_per_video, latency, jitter, ready):
+    server = MockSemanthaServer(MockCorpus(corpus_size, windows_per_video), latency, jitter)
+    ready.send(server.url)
+    server.start()
+    ready.recv()
+    server.stop()
+
+
+@contextmanager
+def serve_in_subprocess(corpus_size: int = 2000, windows_per_video: int = 50, latency: float = 0.02,
+                        jitter: float = 0.0):
+    """Runs the mock server in its own process and yields its url.
+
+    Benchmarks should use this, in the same process the mock competes with the client for the GIL.
+    """
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    process = context.Process(
+        target=_serve, args=(corpus_size, windows_per_video, latency, jitter, child), daemon=True
+    )
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        parent.send("stop")
+        process.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a generated library with the Semantha API.")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Number of sentence windows")
+    parser.add_argument("--windows-per-video", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="Delay of every request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Additional random delay of up to this many seconds")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    corpus = MockCorpus(args.corpus_size, args.windows_per_video)
+    server = MockSemanthaServer(corpus, args.latency, args.jitter, args.port)
+    logging.info(f"Serving {len(corpus.documents)} documents on {server.url}, use any domain and api key.")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Benchmarks Semantha.query_library against the mock Semantha server.
+
+Runs every ranking strategy at each concurrency level and candidate size, reports throughput, latency percentiles
+and HTTP requests per query and compares them with a stored baseline:
+
+    python -m benchmarks.query_library                    # exits with 1 on a regression
+    python -m benchmarks.query_library --update-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.mock_semantha import MockCorpus, serve_in_subprocess
+from video_search.configuration.demo_config import DemoConfig
+from video_search.search import tracing
+from video_search.search.semantha import (
+    DenseOnlyRanking,
+    HybridRanking,
+    Semantha,
+    SparseFilterDenseRanking,
+    WeightedSimilarityRanking,
+)
+
+_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+_STRATEGIES = [DenseOnlyRanking, SparseFilterDenseRanking, HybridRanking, WeightedSimilarityRanking]
+
+
+def run_scenario(semantha: Semantha, queries: list, strategy, concurrency: int, candidates: int,
+                 threshold: float) -> dict:
+    # every scenario starts cold, otherwise the result cache would answer most queries
+    semantha.invalidate_result_cache()
+    semantha.invalidate_metadata_cache()
+
+    def query(text):
+        start = perf_counter()
+        hits = semantha.query_library(
+            text,
+            tags="base",
+            threshold=threshold,
+            max_matches=candidates,
+            ranking_strategy=strategy,
+            sparse_filter_size=candidates,
+            control=False,
+        )
+        return perf_counter() - start, len(hits)
+
+    http_requests = tracing.metrics()["http_requests"]
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(query, queries))
+    elapsed = perf_counter() - start
+    latencies = np.array([latency for latency, _ in results])
+    p50, p95, p99 = np.quantile(latencies, [0.5, 0.95, 0.99]).tolist()
+    return {
+        "throughput": len(queries) / elapsed,
+        "p50": p50,
+        "p95": p95,
+        "p99": p99,
+        "http_per_query": (tracing.metrics()["http_requests"] - http_requests) / len(queries),
+        "hits_per_query": sum(n for _, n in results) / len(queries),
+    }
+
+
+def compare(name: str, result: dict, baseline: dict, tolerance: float, concurrency: int = 1) -> list:
+    if baseline is None:
+        return []
+    regressions = []
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"{name}: throughput {result['throughput']:.1f}/s < {baseline['throughput']:.1f}/s")
+    # the tail percentiles of a few dozen queries are too noisy to gate on, they are only reported
+    if result["p50"] > baseline["p50"] * (1 + tolerance):
+        regressions.append(f"{name}: p50 {result['p50'] * 1000:.1f} ms > {baseline['p50'] * 1000:.1f} ms")
+    # concurrent queries race for the metadata of the same documents, so their request count varies a little
+    http_slack = 0.01 if concurrency == 1 else 0.05 * baseline["http_per_query"]
+    if result["http_per_query"] > baseline["http_per_query"] + http_slack:
+        regressions.append(f"{name}: {result['http_per_query']:.2f} HTTP requests per query > "
+                           f"{baseline['http_per_query']:.2f}")
+    if result["hits_per_query"] < baseline["hits_per_query"] - 0.01:
+        regressions.append(f"{name}: {result['hits_per_query']:.2f} hits per query < "
+                           f"{baseline['hits_per_query']:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query_library against a local mock Semantha server.")
+    parser.add_argument("--corpus-size", type=int, default=5000, help="Number of sentence windows in the mock library")
+    parser.add_argument("--latency", type=float, default=0.02, help="Delay of every mock request in seconds")
+    parser.add_argument("--queries", type=int, default=40, help="Queries per scenario")
+    parser.add_argument("--concurrency", default="1,8", help="Comma separated numbers of concurrent queries")
+    parser.add_argument("--candidates", default="5,50",
+                        help="Comma separated numbers of matches and sparse references per query")
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed relative throughput and median latency regression against the baseline")
+    parser.add_argument("--baseline", default=_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    # streamlit configures the root logger, the per query log lines would drown the report
+    logging.getLogger().setLevel(logging.WARNING)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    queries = MockCorpus(args.corpus_size).sample_queries(args.queries)
+    results = {}
+    regressions = []
+    with serve_in_subprocess(args.corpus_size, latency=args.latency) as url:
+        concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+        semantha = Semantha(
+            # the SDK's default transcript threshold is above every similarity of the generated library
+            DemoConfig(http_pool_size=2 * max(concurrency_levels), retrieval_workers=2 * max(concurrency_levels),
+                       sparse_retrieval_threshold=args.threshold),
+            secrets={"base_url": url, "api_key": "benchmark", "domain": "benchmark"},
+        )
+        # waits for the background login, its request must not count towards the first scenario
+        if not semantha.health_check():
+            sys.exit(f"The mock Semantha server at {url} is not available.")
+        print(f"{'scenario':<45} {'q/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'http/q':>7}")
+        for strategy in _STRATEGIES:
+            for concurrency in concurrency_levels:
+                for candidates in [int(c) for c in args.candidates.split(",")]:
+                    name = f"{strategy.__name__}/c{concurrency}/k{candidates}"
+                    result = run_scenario(semantha, queries, strategy, concurrency, candidates, args.threshold)
+                    results[name] = result
+                    regressions += compare(name, result, baseline.get(name), args.tolerance, concurrency)
+                    print(f"{name:<45} {result['throughput']:>7.1f} {result['p50'] * 1000:>8.1f} "
+                          f"{result['p95'] * 1000:>8.1f} {result['p99'] * 1000:>8.1f} "
+                          f"{result['http_per_query']:>7.2f}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Stored baseline in {args.baseline}")
+    elif regressions:
+        print("\nRegressions against the baseline:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
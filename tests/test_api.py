@@ -0,0 +1,46 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from video_search.api import QueryError, SearchService, parse_query
+
+
+class _Search:
+    # stands in for Semantha, raises ``error`` for every query
+    def __init__(self, error=None):
+        self.error = error
+
+    def query_library(self, text, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return []
+
+
+def _handle(search, path, body):
+    return asyncio.run(SearchService(search, 2).handle("POST", path, json.dumps(body).encode()))
+
+
+@pytest.mark.parametrize("query", [{}, {"text": " "}, {"text": "a", "colour": "red"}, {"text": "a", "max_matches": "3"},
+                                   {"text": "a", "ranking_strategy": "Best"}])
+def test_parse_query_rejects_invalid_queries(query):
+    with pytest.raises(QueryError):
+        parse_query(query)
+
+
+def test_invalid_queries_are_bad_requests():
+    status, _, payload = _handle(_Search(), "/search", {"text": "a", "max_matches": "3"})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload == {"error": "'max_matches' has to be a int"}
+
+
+def test_value_errors_of_the_search_are_server_errors():
+    status, _, payload = _handle(_Search(ValueError("bad response")), "/search", {"text": "a"})
+    assert status == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert payload == {"error": "bad response"}
+
+
+def test_batch_reports_invalid_queries_and_hides_search_errors():
+    _, _, payload = _handle(_Search(ValueError("bad response")), "/search/batch", {"queries": [{}, {"text": "a"}]})
+    assert payload == {"results": [{"error": "'text' is required"}, {"error": "search failed"}]}
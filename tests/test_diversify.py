@@ -0,0 +1,22 @@
+from video_search.search.diversify import diversify
+from video_search.search.metadata import ReferenceMetadata
+from video_search.search.results import SearchHit
+
+
+def _hit(i, video, start, similarity):
+    # libraries converted by search/library.py store the plain video url as the id of every window
+    metadata = ReferenceMetadata({"id": f"https://www.youtube.com/watch?v={video}"}, video, start)
+    return SearchHit(f"d{i}", "n", f"window {i}", similarity, metadata, frozenset())
+
+
+_HITS = [_hit(0, "A", 100, 90), _hit(1, "A", 110, 85), _hit(2, "B", 5, 80), _hit(3, "A", 300, 70)]
+
+
+def test_filter_duplicates_applies_after_merging():
+    hits = diversify(_HITS, 3, merge_gap=15, filter_duplicates=True)
+    assert [(hit.document_id, hit.start, hit.end) for hit in hits] == [("d0", 100, 110), ("d2", 5, 5)]
+
+
+def test_filter_duplicates_keeps_one_hit_per_url_with_mmr():
+    hits = diversify(_HITS, 3, diversity=0.0, filter_duplicates=True)
+    assert [hit.document_id for hit in hits] == ["d0", "d2"]
@@ -0,0 +1,56 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+
+from video_search.search import fanout
+from video_search.search.fanout import ScoreNormalizer, merge_top_k
+
+# the score windows are process wide, every test uses domains of its own
+_domains = (f"test-domain-{i}" for i in itertools.count())
+
+
+def _hits(domain, similarities):
+    return [SimpleNamespace(similarity=s, video_url=f"{domain}/{i}") for i, s in enumerate(similarities)]
+
+
+def test_merges_raw_similarities_until_the_domains_have_enough_samples():
+    a, b = next(_domains), next(_domains)
+    merged = merge_top_k({a: _hits(a, [95, 94, 93]), b: _hits(b, [72, 71, 70])}, ScoreNormalizer(), 6)
+    assert [hit.domain for hit in merged] == [a, a, a, b, b, b]
+    assert merged[0].score == 95
+
+
+def test_merges_zscores_once_every_domain_has_enough_samples():
+    a, b = next(_domains), next(_domains)
+    normalizer = ScoreNormalizer()
+    rng = np.random.default_rng(0)
+    normalizer.normalize({a: rng.normal(90, 5, fanout._MIN_SCORE_SAMPLES), b: rng.normal(70, 5, 10)})
+    # b is still warming up
+    assert normalizer.normalize({a: [95], b: [72]})[a].tolist() == [95]
+    normalizer.normalize({b: rng.normal(70, 5, fanout._MIN_SCORE_SAMPLES)})
+    scores = normalizer.normalize({a: [95], b: [80]})
+    # 80 is far above b's usual similarities, 95 only a little above a's
+    assert scores[b][0] > scores[a][0]
+
+
+def test_windows_are_shared_by_the_normalizers_of_the_process():
+    a = next(_domains)
+    ScoreNormalizer().normalize({a: np.full(fanout._MIN_SCORE_SAMPLES, 80.0)})
+    assert ScoreNormalizer().normalize({a: [80.0]})[a].tolist() == [0.0]
+
+
+def test_keeps_each_domains_order():
+    a, b = next(_domains), next(_domains)
+    merged = merge_top_k({a: _hits(a, [60, 90]), b: _hits(b, [70])}, ScoreNormalizer("none"), 3)
+    assert [(hit.domain, hit.score) for hit in merged] == [(b, 70), (a, 60), (a, 60)]
+
+
+def test_filter_duplicates_keeps_max_per_video_hits_of_a_url():
+    a, b = next(_domains), next(_domains)
+    ranked_hits = {
+        a: [SimpleNamespace(similarity=s, video_url="v") for s in (90, 80)],
+        b: [SimpleNamespace(similarity=85, video_url="v")],
+    }
+    assert len(merge_top_k(ranked_hits, ScoreNormalizer("none"), 3, filter_duplicates=True)) == 1
+    assert len(merge_top_k(ranked_hits, ScoreNormalizer("none"), 3, filter_duplicates=True, max_per_video=2)) == 2
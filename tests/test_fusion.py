@@ -0,0 +1,108 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from video_search.search import fusion
+from video_search.search.semantha import HybridRanking, SparseFilterDenseRanking, WeightedSimilarityRanking
+
+
+def _references(prefix, n, videos, rng, with_missing=True):
+    # similarities sorted descending like the Semantha results, some documents without a video id
+    similarities = sorted((rng.random() for _ in range(n)), reverse=True)
+    references = [SimpleNamespace(document_id=f"{prefix}{i}", similarity=s) for i, s in enumerate(similarities)]
+    video_ids = {
+        r.document_id: None if with_missing and rng.random() < 0.1 else f"v{rng.randrange(videos)}"
+        for r in references
+    }
+    return references, video_ids
+
+
+def _loop_rrf(sentence_references, video_references, video_ids, alpha):
+    # the per reference loop the kernel replaced, references without a video never match
+    sparse = [video_ids.get(c.document_id) for c in video_references]
+    scored = []
+    for i, sr in enumerate(sentence_references):
+        video = video_ids.get(sr.document_id)
+        video_rank = sparse.index(video) if video is not None and video in sparse else None
+        scored.append(((1 / (i + 1)) + (0 if video_rank is None else alpha / (video_rank + 1)), sr))
+    scored.sort(key=lambda a: a[0], reverse=True)
+    return [sr for _, sr in scored]
+
+
+def _loop_weighted(sentence_references, video_references, video_ids, alpha):
+    best = {}
+    for c in video_references:
+        video = video_ids.get(c.document_id)
+        if video is not None:
+            best.setdefault(video, c.similarity)
+    scored = [(sr.similarity + alpha * best.get(video_ids.get(sr.document_id), 0.0), sr)
+              for sr in sentence_references]
+    scored.sort(key=lambda a: a[0], reverse=True)
+    return [sr for _, sr in scored]
+
+
+def _loop_sparse_filter(sentence_references, video_references, video_ids):
+    sparse = {video_ids.get(c.document_id) for c in video_references} - {None}
+    return [sr for sr in sentence_references if video_ids.get(sr.document_id) in sparse]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_hybrid_ranking_matches_loop(seed):
+    rng = random.Random(seed)
+    dense, dense_ids = _references("s", rng.randrange(1, 60), 15, rng)
+    sparse, sparse_ids = _references("t", rng.randrange(1, 10), 15, rng)
+    video_ids = {**dense_ids, **sparse_ids}
+    alpha = rng.choice([0.0, 0.3, 0.7, 1.0])
+    ranked = HybridRanking(video_ids).rank(list(dense), sparse, alpha)
+    assert ranked == _loop_rrf(dense, sparse, video_ids, alpha)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_weighted_similarity_ranking_matches_loop(seed):
+    rng = random.Random(seed)
+    dense, dense_ids = _references("s", rng.randrange(1, 60), 15, rng)
+    sparse, sparse_ids = _references("t", rng.randrange(1, 10), 15, rng)
+    video_ids = {**dense_ids, **sparse_ids}
+    ranked = WeightedSimilarityRanking(video_ids).rank(list(dense), sparse, 0.7)
+    assert ranked == _loop_weighted(dense, sparse, video_ids, 0.7)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_sparse_filter_matches_loop(seed):
+    rng = random.Random(seed)
+    dense, dense_ids = _references("s", rng.randrange(1, 60), 15, rng)
+    sparse, sparse_ids = _references("t", rng.randrange(1, 10), 15, rng)
+    video_ids = {**dense_ids, **sparse_ids}
+    ranked = SparseFilterDenseRanking(video_ids).rank(list(dense), sparse)
+    assert ranked == _loop_sparse_filter(dense, sparse, video_ids)
+
+
+def test_hybrid_ranking_reorders_non_empty_results():
+    # the old guard returned every non-empty list unchanged
+    dense = [SimpleNamespace(document_id=f"s{i}", similarity=0.9 - i / 10) for i in range(3)]
+    sparse = [SimpleNamespace(document_id="t0", similarity=0.8)]
+    video_ids = {"s0": "a", "s1": "b", "s2": "b", "t0": "b"}
+    ranked = HybridRanking(video_ids).rank(list(dense), sparse, alpha=1.0)
+    # 1/2 + 1 and 1/3 + 1 for the videos in the sparse results, 1 for s0
+    assert [r.document_id for r in ranked] == ["s1", "s2", "s0"]
+
+
+def test_references_without_video_never_match():
+    dense = [SimpleNamespace(document_id="s0", similarity=0.9), SimpleNamespace(document_id="s1", similarity=0.8)]
+    sparse = [SimpleNamespace(document_id="t0", similarity=0.8)]
+    video_ids = {"s0": None, "s1": "a", "t0": None}
+    assert SparseFilterDenseRanking(video_ids).rank(list(dense), sparse) == []
+    dense_codes, sparse_codes, n_codes = fusion.encode_video_ids([None, "a", None], [None, "a"])
+    assert fusion.sparse_filter(dense_codes, sparse_codes).tolist() == [1]
+    assert fusion.reciprocal_rank_fusion(dense_codes, sparse_codes, n_codes, 10.0).tolist() == [1, 0, 2]
+
+
+def test_ties_keep_dense_order():
+    dense_codes, sparse_codes, n_codes = fusion.encode_video_ids(["a", "b", "c", "d"], ["x"])
+    similarities = np.array([0.5, 0.7, 0.7, 0.5])
+    order = fusion.weighted_similarity_fusion(dense_codes, similarities, sparse_codes, np.array([0.9]), n_codes, 0.7)
+    assert order.tolist() == [1, 2, 0, 3]
+    # without sparse matches the reciprocal rank fusion keeps the dense order
+    assert fusion.reciprocal_rank_fusion(dense_codes, sparse_codes, n_codes, 0.7).tolist() == [0, 1, 2, 3]
@@ -0,0 +1,64 @@
+from video_search.ingest import content_hash, plan, window_key
+from video_search.search.library import LibraryRow
+
+
+def _row(i, start, tags=("SENTENCE_LEVEL",), content=None):
+    metadata = {"id": f"https://www.youtube.com/watch?v=v{i}", "start": start}
+    return LibraryRow(f"r{i}-{start}", f"Video {i}", content or f"window {i} {start}", list(tags), metadata)
+
+
+def _managed(document_id, row):
+    return document_id, content_hash(row), window_key(row.metadata, row.tags)
+
+
+def _by_hand(document_id, row):
+    return document_id, None, window_key(row.metadata, row.tags)
+
+
+_ROWS = [_row(0, 0, ("TRANSCRIPT_LEVEL",)), _row(0, 0), _row(0, 30), _row(1, 0)]
+
+
+def test_uploads_every_row_to_an_empty_domain():
+    uploads, deletes = plan(_ROWS, [], delete_unmanaged=False)
+    assert [row for _, row in uploads] == _ROWS
+    assert deletes == []
+
+
+def test_uploads_changed_and_deletes_removed_rows():
+    changed = _row(0, 30, content="new text")
+    remote = [_managed("d0", _ROWS[0]), _managed("d1", _ROWS[1]), _managed("d2", _ROWS[2]), _managed("d3", _ROWS[3])]
+    uploads, deletes = plan([_ROWS[0], _ROWS[1], changed], remote, delete_unmanaged=False)
+    assert [row for _, row in uploads] == [changed]
+    assert deletes == ["d2", "d3"]
+
+
+def test_deletes_duplicate_uploads():
+    uploads, deletes = plan(_ROWS[:1], [_managed("d0", _ROWS[0]), _managed("d1", _ROWS[0])], delete_unmanaged=False)
+    assert uploads == []
+    assert deletes == ["d1"]
+
+
+def test_documents_uploaded_by_hand_stand_in_for_their_rows():
+    remote = [_by_hand(f"h{i}", row) for i, row in enumerate(_ROWS[:3])]
+    uploads, deletes = plan(_ROWS, remote, delete_unmanaged=False)
+    # the transcript and the first window of video 0 share url and start, the level tells them apart
+    assert [row for _, row in uploads] == [_ROWS[3]]
+    assert deletes == []
+
+
+def test_unmanaged_documents_without_a_row_are_kept():
+    uploads, deletes = plan(_ROWS[:1], [_by_hand("h0", _row(7, 0)), ("h1", None, (None, 0, ()))], False)
+    assert [row for _, row in uploads] == _ROWS[:1]
+    assert deletes == []
+
+
+def test_managed_documents_win_over_unmanaged_ones():
+    uploads, deletes = plan(_ROWS[:1], [_by_hand("h0", _ROWS[0]), _managed("d0", _ROWS[0])], delete_unmanaged=False)
+    assert uploads == []
+    assert deletes == []
+
+
+def test_delete_unmanaged_replaces_documents_uploaded_by_hand():
+    uploads, deletes = plan(_ROWS[:2], [_by_hand("h0", _ROWS[0]), _managed("d1", _ROWS[1])], delete_unmanaged=True)
+    assert [row for _, row in uploads] == _ROWS[:1]
+    assert deletes == ["h0"]
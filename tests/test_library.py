@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from video_transcription.library import build_windows
+
+
+def _segments(n, seed=0):
+    rng = random.Random(seed)
+    words = ["data", "model", "search", "video", "", "ä", "  spaced  ", "line\nbreak"]
+    return [{"text": " ".join(rng.choice(words) for _ in range(rng.randrange(0, 5)))} for _ in range(n)]
+
+
+def _joined_windows(segments, window_size, stride):
+    # the windows as they were built before the prefix offsets
+    for start in range(0, len(segments), stride):
+        end = min(len(segments) - 1, start + window_size)
+        yield start, end, " ".join(s["text"] for s in segments[start:end + 1])
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 40])
+@pytest.mark.parametrize("window_size", [0, 1, 6, 50])
+@pytest.mark.parametrize("stride", [1, 2, 3, 10])
+def test_windows_match_joined_segments(n, window_size, stride):
+    segments = _segments(n, seed=n * 100 + window_size * 10 + stride)
+    assert list(build_windows(segments, window_size, stride)) == list(_joined_windows(segments, window_size, stride))
+
+
+def test_no_segments_no_windows():
+    assert list(build_windows([], 6)) == []
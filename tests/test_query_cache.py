@@ -0,0 +1,19 @@
+from video_search.search.query_cache import NearDuplicateQueryCache, query_fingerprint
+
+
+def test_fingerprint_ignores_case_punctuation_and_filler():
+    assert query_fingerprint("How does the Semantha API work?") == query_fingerprint("how does semantha api work")
+    assert query_fingerprint("Please explain the data model") == query_fingerprint("data model")
+
+
+def test_fingerprint_keeps_word_order_and_direction():
+    assert query_fingerprint("convert mp4 to wav") != query_fingerprint("convert wav to mp4")
+    assert query_fingerprint("convert wav from mp4") != query_fingerprint("convert wav to mp4")
+
+
+def test_serves_rephrasings_of_the_same_parameters_only():
+    cache = NearDuplicateQueryCache(10, 60)
+    cache.put(("domain", 3), "Please show me the data model!", ("hit",))
+    assert cache.get(("domain", 3), "data model") == ("hit",)
+    assert cache.get(("domain", 5), "data model") is None
+    assert cache.get(("domain", 3), "model data") is None
@@ -0,0 +1,31 @@
+import json
+import threading
+
+from video_search.search.tracking import UsageTracker
+
+
+def test_replays_the_spill_of_an_earlier_process(tmp_path):
+    spill_path = tmp_path / "spill.jsonl"
+    spill_path.write_text("".join(json.dumps({"content": f"q{i}", "tag": "u"}) + "\n" for i in range(3)))
+    written = []
+    tracker = UsageTracker(lambda content, tag: written.append(content), flush_interval=0.05,
+                           spill_path=str(spill_path))
+    tracker.track("q3", "u")
+    tracker.close()
+    assert sorted(written) == ["q0", "q1", "q2", "q3"]
+    assert tracker.stats() == {"queued": 0, "written": 4, "dropped": 0, "spilled": 0, "replayed": 3}
+    assert not spill_path.exists()
+
+
+def test_counts_every_dropped_event():
+    release = threading.Event()
+    tracker = UsageTracker(lambda content, tag: release.wait(), max_queue=1, batch_size=1, flush_interval=0.05)
+    threads = [threading.Thread(target=lambda: [tracker.track("q", "u") for _ in range(500)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+    tracker.close()
+    stats = tracker.stats()
+    assert stats["written"] + stats["dropped"] == 2000
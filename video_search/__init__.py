@@ -1,3 +1,9 @@
-from .video_search import VideoSearch
 from video_search.configuration.demo_config import DemoConfig
 
+
+def __getattr__(name):
+    # the Streamlit app is only imported when it is used, the API service and the CLIs start without it
+    if name == "VideoSearch":
+        from .video_search import VideoSearch
+        return VideoSearch
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
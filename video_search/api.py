@@ -0,0 +1,250 @@
+"""Search as an HTTP/JSON service, without Streamlit.
+
+    python -m video_search.api --config api.json --port 8000
+
+Routes:
+    POST /search        {"text": "...", "max_matches": 5, ...}  -> {"hits": [...]}
+                        with several domains also "partial" and "failed" (domain -> "timeout" or the error)
+    POST /search/batch  {"queries": [{"text": "..."}, ...]}     -> {"results": [{"hits": [...]} or {"error": "..."}]}
+    GET  /health                                                -> {"status": "ok"}
+    GET  /metrics                                               -> latency percentiles in the Prometheus text format
+
+The configuration file is JSON with the DemoConfig fields and a "semantha" section like the Streamlit secrets.
+Environment variables override it: VIDEO_SEARCH_<FIELD> for DemoConfig fields (e.g. VIDEO_SEARCH_HTTP_POOL_SIZE)
+and SEMANTHA_BASE_URL, SEMANTHA_API_KEY, SEMANTHA_DOMAIN, SEMANTHA_TRACKING_DOMAIN.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+
+from video_search.configuration.demo_config import DemoConfig
+from video_search.search import tracing
+from video_search.search.fanout import MultiDomainSemantha, create_search
+from video_search.search.semantha import (
+    DenseOnlyRanking,
+    HybridRanking,
+    SearchTimeoutError,
+    SparseFilterDenseRanking,
+    WeightedSimilarityRanking,
+)
+
+_STRATEGIES = {
+    strategy.__name__: strategy
+    for strategy in (DenseOnlyRanking, SparseFilterDenseRanking, HybridRanking, WeightedSimilarityRanking)
+}
+_QUERY_FIELDS = {
+    "tags": str, "threshold": float, "max_matches": int, "sparse_filter_size": int, "alpha": float,
+    "filter_duplicates": bool, "control": bool, "max_per_video": int, "merge_gap": float, "diversity": float,
+}
+_SECRETS = ("base_url", "api_key", "domain", "tracking_domain")
+_MAX_BATCH_SIZE = 100
+_MAX_BODY_SIZE = 1024 * 1024
+
+
+def load_config(path: str = None, environ=os.environ) -> tuple:
+    """(DemoConfig, semantha secrets) from a JSON file and the environment, the environment wins."""
+    values = {}
+    if path is not None:
+        with open(path, encoding="utf-8") as f:
+            values = json.load(f)
+    secrets = dict(values.pop("semantha", {}))
+    for key in _SECRETS:
+        if f"SEMANTHA_{key.upper()}" in environ:
+            secrets[key] = environ[f"SEMANTHA_{key.upper()}"]
+    for field in dataclasses.fields(DemoConfig):
+        value = environ.get(f"VIDEO_SEARCH_{field.name.upper()}")
+        if value is not None:
+            values[field.name] = _parse_value(value, field.type)
+    return DemoConfig(**values), secrets
+
+
+def _parse_value(value: str, field_type):
+    if field_type in (bool, "bool"):
+        return value.lower() in ("1", "true", "yes")
+    if field_type in (int, "int"):
+        return int(value)
+    if field_type in (float, "float"):
+        return float(value)
+    return value
+
+
+def hit_to_json(hit) -> dict:
+    return {
+        "document_id": hit.document_id,
+        "name": hit.name,
+        "content": hit.content,
+        "similarity": hit.similarity,
+        "video_url": hit.video_url,
+        "video_id": hit.metadata.video_id,
+        "start": hit.start,
+        "end": hit.end,
+        "tags": sorted(hit.tags),
+    }
+
+
+class QueryError(ValueError):
+    """A request that is not a valid query, answered with 400."""
+
+
+def parse_query(query: dict) -> dict:
+    if not isinstance(query, dict) or not isinstance(query.get("text"), str) or not query["text"].strip():
+        raise QueryError("'text' is required")
+    unknown = set(query) - set(_QUERY_FIELDS) - {"text", "ranking_strategy"}
+    if unknown:
+        raise QueryError(f"unknown fields {sorted(unknown)}")
+    kwargs = {"text": query["text"], "control": False}
+    for name, field_type in _QUERY_FIELDS.items():
+        if query.get(name) is not None:
+            if field_type is float and isinstance(query[name], int) and not isinstance(query[name], bool):
+                kwargs[name] = float(query[name])
+            elif not isinstance(query[name], field_type):
+                raise QueryError(f"'{name}' has to be a {field_type.__name__}")
+            else:
+                kwargs[name] = query[name]
+    kwargs.setdefault("tags", "base,11")
+    if "ranking_strategy" in query:
+        if query["ranking_strategy"] not in _STRATEGIES:
+            raise QueryError(f"'ranking_strategy' has to be one of {sorted(_STRATEGIES)}")
+        kwargs["ranking_strategy"] = _STRATEGIES[query["ranking_strategy"]]
+    return kwargs
+
+
+class SearchService:
+    """Routes requests to Semantha.query_library, which blocks, on a thread pool."""
+
+    def __init__(self, semantha, workers: int):
+        self.__semantha = semantha
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+
+    async def search(self, query: dict) -> dict:
+        kwargs = parse_query(query)
+        text = kwargs.pop("text")
+        if isinstance(self.__semantha, MultiDomainSemantha):
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.__executor, partial(self.__semantha.search, text, **kwargs)
+            )
+            return {
+                "hits": [{**hit_to_json(d.hit), "domain": d.domain, "score": d.score} for d in result.hits],
+                "partial": result.partial,
+                "failed": result.failed,
+            }
+        hits = await asyncio.get_running_loop().run_in_executor(
+            self.__executor, partial(self.__semantha.query_library, text, **kwargs)
+        )
+        return {"hits": [hit_to_json(hit) for hit in hits]}
+
+    async def search_batch(self, body: dict) -> dict:
+        queries = body.get("queries") if isinstance(body, dict) else None
+        if not isinstance(queries, list) or len(queries) > _MAX_BATCH_SIZE:
+            raise QueryError(f"'queries' has to be a list of at most {_MAX_BATCH_SIZE} queries")
+        results = await asyncio.gather(*(self.search(query) for query in queries), return_exceptions=True)
+        return {"results": [_batch_result(result) for result in results]}
+
+    async def health(self) -> dict:
+        healthy = await asyncio.get_running_loop().run_in_executor(self.__executor, self.__semantha.health_check)
+        return {"status": "ok" if healthy else "unavailable"}
+
+    async def handle(self, method: str, path: str, body: bytes) -> tuple:
+        """(status, content type, body) of a request."""
+        routes = {
+            ("POST", "/search"): self.search,
+            ("POST", "/search/batch"): self.search_batch,
+        }
+        try:
+            if method == "GET" and path == "/health":
+                return HTTPStatus.OK, "application/json", await self.health()
+            if method == "GET" and path == "/metrics":
+                return HTTPStatus.OK, "text/plain; version=0.0.4", tracing.export_prometheus()
+            if (method, path) not in routes:
+                known = any(route_path == path for _, route_path in routes)
+                status = HTTPStatus.METHOD_NOT_ALLOWED if known else HTTPStatus.NOT_FOUND
+                return status, "application/json", {"error": status.phrase}
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise QueryError("the body has to be JSON")
+            return HTTPStatus.OK, "application/json", await routes[method, path](request)
+        except QueryError as e:
+            return HTTPStatus.BAD_REQUEST, "application/json", {"error": str(e)}
+        except SearchTimeoutError as e:
+            return HTTPStatus.GATEWAY_TIMEOUT, "application/json", {"error": str(e)}
+        except Exception as e:
+            logging.exception(f"{method} {path} failed")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, "application/json", {"error": str(e) or type(e).__name__}
+
+
+def _batch_result(result) -> dict:
+    if isinstance(result, (QueryError, SearchTimeoutError)):
+        return {"error": str(result)}
+    if isinstance(result, Exception):
+        logging.error(f"Batch query failed: {result!r}")
+        return {"error": "search failed"}
+    return result
+
+
+async def _serve_connection(service: SearchService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # minimal HTTP/1.1 with keep-alive, enough for JSON clients and load balancers
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length > _MAX_BODY_SIZE:
+                status, content_type, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "application/json", {
+                    "error": "body too large"}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(length) if length > 0 else b""
+                status, content_type, payload = await service.handle(method, target.split("?")[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            data = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service: SearchService, host: str, port: int):
+    server = await asyncio.start_server(partial(_serve_connection, service), host, port)
+    logging.info(f"Serving the search API on {', '.join(str(s.getsockname()) for s in server.sockets)}.")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serve the video search as an HTTP/JSON API.")
+    parser.add_argument('--config', type=str, default=os.environ.get("VIDEO_SEARCH_CONFIG"),
+                        help='JSON file with DemoConfig fields and a "semantha" section')
+    parser.add_argument('--host', type=str, default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=32, help='concurrent searches')
+    args = parser.parse_args()
+
+    demo_config, secrets = load_config(args.config)
+    semantha = create_search(demo_config, secrets=secrets)
+    asyncio.run(serve(SearchService(semantha, args.workers), args.host, args.port))
@@ -0,0 +1,44 @@
+import argparse
+import logging
+
+from video_search.search.catalog import Catalog
+from video_search.search.client import get_client
+from video_search.search.domain import add_connection_arguments, fill_connection_arguments, iter_domain_documents
+from video_search.search.library import load_library
+
+
+def library_documents(library_path: str):
+    # document ids as served by the local backend
+    for row in load_library(library_path):
+        yield row.id, row.name, row.tags, row.metadata
+
+
+def domain_documents(sdk, domain: str):
+    for doc, metadata in iter_domain_documents(sdk, domain, "id,name,tags,metadata"):
+        if "id" not in metadata:
+            logging.warning(f"Skipping document {doc.id} without a video url in its metadata.")
+            continue
+        yield doc.id, doc.name, doc.tags or [], metadata
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Write the catalog (document id to video, start, name and tags) that the search loads at startup "
+                    "instead of fetching and parsing document metadata per query."
+    )
+    parser.add_argument('--output', type=str, required=True, help='catalog directory, set it as catalog_path')
+    parser.add_argument('--library', type=str, default=None,
+                        help='build from a library for the local backend instead of exporting the Semantha domain')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    if args.library is not None:
+        documents = library_documents(args.library)
+    else:
+        fill_connection_arguments(args)
+        documents = domain_documents(get_client(args.server_url, args.api_key), args.domain)
+
+    catalog = Catalog.build(documents)
+    catalog.save(args.output)
+    logging.info(f"Wrote {len(catalog)} documents to {args.output}.")
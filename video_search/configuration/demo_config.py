@@ -2,4 +2,39 @@ from dataclasses import dataclass
 
 @dataclass
 class DemoConfig:
-    pass
\ No newline at end of file
+    # "semantha" or "local" (search the transcription output without the Semantha server)
+    retrieval_backend: str = "semantha"
+    local_library_path: str = "library"
+    local_embedding_model: str = None
+    # written by python -m video_search.catalog, None fetches and parses the document metadata per query
+    catalog_path: str = None
+    http_pool_size: int = 16
+    metadata_cache_size: int = 4096
+    metadata_cache_ttl: float = 3600.0
+    retrieval_workers: int = 8
+    dense_retrieval_timeout: float = 20.0
+    sparse_retrieval_timeout: float = 5.0
+    # None keeps the default of the Semantha SDK (0.85)
+    sparse_retrieval_threshold: float = None
+    result_cache_size: int = 512
+    result_cache_max_bytes: int = 32 * 1024 * 1024
+    result_cache_ttl: float = 600.0
+    # serve rephrasings of a cached query (case, punctuation, filler words) from the cache
+    near_duplicate_cache: bool = False
+    # also match recent queries by embedding (local_embedding_model or TF-IDF) above the cutoff
+    near_duplicate_embedding: bool = False
+    near_duplicate_cutoff: float = 0.92
+    # candidates fetched per requested match when hits are merged, capped per video or diversified
+    diversify_overfetch: int = 3
+    # comma separated domains (local library paths for the local backend) searched in parallel and merged,
+    # None searches the domain of the secrets only
+    domains: str = None
+    # hits of domains that did not answer in time are left out, the search returns what the others found
+    domain_timeout: float = 5.0
+    # "zscore" makes the similarities of different domains comparable, "none" merges them as they are
+    score_normalization: str = "zscore"
+    fanout_workers: int = 8
+    tracking_queue_size: int = 1000
+    tracking_batch_size: int = 20
+    tracking_flush_interval: float = 5.0
+    tracking_spill_path: str = "usage_tracking_spill.jsonl"
@@ -0,0 +1,136 @@
+import argparse
+import hashlib
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from video_search.search.client import get_client, with_retries
+from video_search.search.domain import (
+    MANAGED_TAGS, add_connection_arguments, fill_connection_arguments, iter_domain_documents
+)
+from video_search.search.library import load_library
+
+
+def content_hash(row) -> str:
+    payload = json.dumps([row.name, row.content, sorted(row.tags), row.metadata], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def window_key(metadata: dict, tags) -> tuple:
+    """(video url, start, level tags) of a row or document, the same for a row and its document uploaded by hand."""
+    levels = MANAGED_TAGS.split(",")
+    return metadata.get("id"), metadata.get("start", 0), tuple(sorted(tag for tag in tags if tag in levels))
+
+
+def list_remote(sdk, domain: str) -> list:
+    """(document id, content hash or None, window key) of every transcript and segment document in the domain."""
+    return [
+        (doc.id, metadata.get("content_hash"), window_key(metadata, doc.tags or []))
+        for doc, metadata in iter_domain_documents(sdk, domain, "id,tags,metadata")
+    ]
+
+
+def plan(rows, remote, delete_unmanaged: bool):
+    """Rows to upload and document ids to delete, so that the domain matches the local library.
+
+    Documents without a content hash were uploaded by hand or before this command existed. They are deleted with
+    ``delete_unmanaged``, otherwise they are kept and stand in for the row of the same window, which is not uploaded.
+    """
+    local = {content_hash(row): row for row in rows}
+    uploaded = set()
+    deletes = []
+    unmanaged = []
+    for document_id, remote_hash, key in remote:
+        if remote_hash is None:
+            unmanaged.append((document_id, key))
+        elif remote_hash not in local or remote_hash in uploaded:
+            # removed or changed locally, or a duplicate upload
+            deletes.append(document_id)
+        else:
+            uploaded.add(remote_hash)
+    if delete_unmanaged:
+        deletes.extend(document_id for document_id, _ in unmanaged)
+    else:
+        # after the managed documents, a row that has one keeps it
+        row_hashes = {window_key(row.metadata, row.tags): h for h, row in local.items()}
+        adopted = {row_hashes[key] for _, key in unmanaged if key[0] is not None and key in row_hashes} - uploaded
+        uploaded |= adopted
+        if unmanaged:
+            logging.info(f"Keeping {len(unmanaged)} documents not uploaded by this command, "
+                         f"{len(adopted)} of them stand in for local rows.")
+    uploads = [(h, row) for h, row in local.items() if h not in uploaded]
+    return uploads, deletes
+
+
+def upload(sdk, domain: str, row, row_hash: str) -> None:
+    content = io.BytesIO(row.content.encode("utf-8"))
+    content.name = "input.txt"
+    metadata = dict(row.metadata, row_id=row.id, content_hash=row_hash)
+    with_retries(lambda: sdk.domains(domain).reference_documents.post(
+        name=row.name, tags=",".join(row.tags), metadata=str(metadata), file=_rewind(content)
+    ))
+
+
+def delete(sdk, domain: str, document_id: str) -> None:
+    with_retries(lambda: sdk.domains(domain).reference_documents(document_id).delete())
+
+
+def _rewind(file):
+    # a retried upload has to send the file from the start again
+    file.seek(0)
+    return file
+
+
+def _run_batches(pool, function, items, batch_size: int, label: str) -> None:
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        # list() re-raises the first failure of the batch
+        list(pool.map(function, batch))
+        logging.info(f"{label} {min(start + batch_size, len(items))} of {len(items)}.")
+
+
+def ingest(sdk, domain: str, library_path: str, workers: int = 8, batch_size: int = 100,
+           delete_unmanaged: bool = False, dry_run: bool = False):
+    rows = load_library(library_path)
+    remote = list_remote(sdk, domain)
+    uploads, deletes = plan(rows, remote, delete_unmanaged)
+    logging.info(f"{len(rows)} local rows, {len(remote)} remote documents: "
+                 f"{len(uploads)} to upload, {len(deletes)} to delete.")
+    if dry_run:
+        return uploads, deletes
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        _run_batches(pool, lambda item: upload(sdk, domain, item[1], item[0]), uploads, batch_size, "Uploaded")
+        # delete after uploading, so changed rows are never missing from the domain
+        _run_batches(pool, lambda document_id: delete(sdk, domain, document_id), deletes, batch_size, "Deleted")
+    return uploads, deletes
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Upload a library written by video_transcription/run.py to a Semantha domain. "
+                    "Only new and changed rows are uploaded, rows that are gone are deleted."
+    )
+    parser.add_argument('--library', type=str, required=True,
+                        help='library directory or semantha_library.xlsx')
+    add_connection_arguments(parser)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--delete-unmanaged', action='store_true',
+                        help='also delete transcript and segment documents that were not uploaded by this command, '
+                             'by default they are kept and replace the upload of the row of the same video and start')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    fill_connection_arguments(args)
+
+    ingest(
+        get_client(args.server_url, args.api_key, pool_size=args.workers),
+        args.domain,
+        args.library,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        delete_unmanaged=args.delete_unmanaged,
+        dry_run=args.dry_run,
+    )
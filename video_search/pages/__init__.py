@@ -1,3 +1,12 @@
-from .page_manager import PageManager
-from .search_page import SearchPage
-from .sidebar import Sidebar
+_PAGES = {
+    "PageManager": "page_manager",
+    "SearchPage": "search_page",
+    "Sidebar": "sidebar",
+}
+
+
+def __getattr__(name):
+    if name in _PAGES:
+        import importlib
+        return getattr(importlib.import_module(f".{_PAGES[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,18 @@
-import ast
+import itertools
 
 import streamlit as st
-from streamlit_player import st_player
 
 from .abstract_page import AbstractPage
+from video_search.search.results import hits_to_frame
+from video_search.search.semantha import SearchTimeoutError
+from video_search.search.tracing import metrics
 
-import time
+_THUMBNAIL_URL = "https://img.youtube.com/vi/{}/mqdefault.jpg"
+
+
+def _format_timestamp(seconds) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
 
 
 class SearchPage(AbstractPage):
@@ -31,7 +38,10 @@ class SearchPage(AbstractPage):
                 _, _, col, _, _ = st.columns(5)
                 button = col.form_submit_button("🔍 Search")
             if button:
-                self.__search(search_string)
+                st.session_state["submitted_search"] = search_string
+            if st.session_state.get("submitted_search"):
+                # keep showing the results on reruns, e.g. when a video player is opened
+                self.__search(st.session_state["submitted_search"])
 
     def __search_form(self):
         if st.session_state.control:
@@ -65,77 +75,93 @@ class SearchPage(AbstractPage):
             self.__content_search(search_string, tags)
 
     def __content_search(self, search_string, tags):
+        hits = self.__semantha.iter_query_library(
+            search_string,
+            tags=tags,
+            max_matches=self.__sidebar.get_max_matches(),
+            ranking_strategy=self.__sidebar.get_ranking_strategy(),
+            sparse_filter_size=self.__sidebar.get_filter_size(),
+            alpha=self.__sidebar.get_alpha(),
+            filter_duplicates=self.__sidebar.get_filter_duplicates(),
+            max_per_video=self.__sidebar.get_max_per_video(),
+            merge_gap=self.__sidebar.get_merge_gap(),
+            diversity=self.__sidebar.get_diversity(),
+            threshold=self.__sidebar.get_threshold()
+        )
+        # only wait for the first match, the others are rendered as they arrive
         with st.spinner("🕵🏻 Looking for a matching video ..."):
-            results = self.__semantha.query_library(
-                search_string,
-                tags=tags,
-                max_matches=self.__sidebar.get_max_matches(),
-                ranking_strategy=self.__sidebar.get_ranking_strategy(),
-                sparse_filter_size=self.__sidebar.get_filter_size(),
-                alpha=self.__sidebar.get_alpha(),
-                filter_duplicates=self.__sidebar.get_filter_duplicates(),
-                threshold=self.__sidebar.get_threshold()
+            try:
+                first_hit = next(hits, None)
+            except SearchTimeoutError:
+                st.error("⏳ The search took too long, please try again in a moment.")
+                return
+        # reruns render the same results again, only track the first time a query is shown
+        track = self.__sidebar.get_enable_usage_tracking() and st.session_state.get("last_search") != search_string
+        st.session_state["last_search"] = search_string
+        if first_hit is None:
+            self.__no_match_handling(search_string, track)
+        else:
+            self.__match_handling(search_string, itertools.chain([first_hit], hits), track)
+
+    def __match_handling(self, search_string, hits, track):
+        status = st.empty()
+        if track:
+            self.__semantha.track_usage(
+                content=search_string, tag=st.session_state.user_id
             )
-            if results.empty:
-                self.__no_match_handling(search_string)
-            else:
-                self.__match_handling(search_string, results)
 
-    def __match_handling(self, search_string, results):
+        results = []
+        if self.__sidebar.get_show_videos_below_each_other():
+            for i, hit in enumerate(hits, start=1):
+                results.append(hit)
+                self.__display_results_below_each_other(i, hit)
+        else:
+            # tabs need to know all matches upfront
+            results = list(hits)
+            st.session_state["tabs"] = [f"Video {i}" for i in range(1, len(results) + 1)]
+            tabs = st.tabs(st.session_state["tabs"])
+            for i, hit in enumerate(results, start=1):
+                self.__display_result_in_tabs(i, hit, tabs)
+
         video_string = "Matching video" if len(results) == 1 else "Matching videos"
-        st.success(
+        status.success(
             f"Done! I have found **{len(results)}** {video_string} for you!",
             icon="🕵🏻",
         )
-        if self.__sidebar.get_enable_usage_tracking():
-            self.__semantha.add_to_library(
-                content=search_string, tag=st.session_state.user_id
-            )
-
-        if not self.__sidebar.get_show_videos_below_each_other():
-            st.session_state["tabs"] = ["Video 1"]
-            for i, row in results.iterrows():
-                if i >= 2:
-                    st.session_state["tabs"].append(f"Video {i}")
-
-            tabs = st.tabs(st.session_state["tabs"])
-        for i, row in results.iterrows():
-            if self.__sidebar.get_show_videos_below_each_other():
-                self.__display_results_below_each_other(results, i, row)
-            else:
-                self.__display_result_in_tabs(results, i, row, tabs)
         if self.__sidebar.get_debug():
             self.__debug_view(results)
 
     def __debug_view(self, results):
         with st.expander("Results", expanded=False):
-            st.write(results)
-
-    def __no_match_handling(self, search_string):
+            st.write(hits_to_frame(results))
+        trace = self.__semantha.get_last_trace()
+        if trace is not None:
+            with st.expander(f"Timing ({trace.http_requests} HTTP requests)", expanded=False):
+                st.dataframe(trace.breakdown())
+                st.write("Latency percentiles of all queries in seconds")
+                st.json(metrics())
+
+    def __no_match_handling(self, search_string, track):
         st.error(
             "I couldn't find a matching video. ",
             icon="🕵🏻",
         )
-        if self.__sidebar.get_enable_usage_tracking():
-            self.__semantha.add_to_library(
+        if track:
+            self.__semantha.track_usage(
                 content=search_string, tag=st.session_state.user_id + ",no_match"
             )
 
-    def __display_result_in_tabs(self, results, i, row, tabs):
-        video_id, start, content, category, video = self.__get_result_info(
-            results, i, row
-        )
+    def __display_result_in_tabs(self, i, hit, tabs):
+        video_id, start, end, content, category, video, _ = self.__get_result_info(hit)
         with tabs[i - 1]:
-            self.__display_video(video_id, start, content, category, video)
+            self.__display_video(hit, video_id, start, end, content, category, video)
 
-    def __display_results_below_each_other(self, results, i, row):
-        video_id, start, content, category, video, similarity = self.__get_result_info(
-            results, i, row
-        )
-        st.subheader(f"Video {i} of {len(results)} ({similarity}%)")
-        self.__display_video(video_id, start, content, category, video)
-        if i >= 1 and i < len(results):
+    def __display_results_below_each_other(self, i, hit):
+        video_id, start, end, content, category, video, similarity = self.__get_result_info(hit)
+        if i > 1:
             self.__display_horizontal_line()
+        st.subheader(f"Video {i} ({similarity}%)")
+        self.__display_video(hit, video_id, start, end, content, category, video)
 
     def __display_horizontal_line(self):
         st.markdown(
@@ -143,28 +169,49 @@ class SearchPage(AbstractPage):
             unsafe_allow_html=True,
         )
 
-    def __display_video(self, video_id, start, content, category, video):
+    def __display_video(self, hit, video_id, start, end, content, category, video):
         if not st.session_state.control:
             st.markdown(f'💬 **The reference says:** "_{content}..._"')
+        if end > start:
+            st.markdown(f"⏱️ **Matching section:** _{_format_timestamp(start)} - {_format_timestamp(end)}_")
         st.markdown(f"🏷️ **Tags:** _{category}_")
-        st_player(f"{str(video_id)}?#t={start}s&rel=0", height=400, key=f"{video_id}_{time.time_ns()}", config={
-            "vimeo": {
-                "playerOptions": {
-                    "color": "#BE25BE",
-                    "title": False,
+        # stable per result, so reruns keep mounted players instead of reloading every embed
+        player_key = f"player_{hit.document_id}_{start}"
+        if player_key in st.session_state.get("open_players", set()):
+            # the player component is only loaded once somebody opens a video
+            from streamlit_player import st_player
+            st_player(f"{str(video_id)}?#t={start}s&rel=0", height=400, key=player_key, config={
+                "vimeo": {
+                    "playerOptions": {
+                        "color": "#BE25BE",
+                        "title": False,
+                    }
                 }
-            }
-        })
+            })
+        else:
+            self.__display_preview(player_key, hit.metadata.video_id, start)
         st.markdown(f"📺 **Video:** _{video}_")
 
-    def __get_result_info(self, results, i, row):
-        results.at[i, "Metadata"] = ast.literal_eval(row["Metadata"])
-        video_id = results.at[i, "Metadata"]["id"]
-        start = 0 if st.session_state.control else results.at[i, "Metadata"]["start"]
-        content = results.at[i, "Content"]
-        category = results.at[i, "Tags"]
-        category = [tag for tag in category if tag not in ["base", "11"]]
+    def __display_preview(self, player_key, youtube_id, start):
+        # a thumbnail is a single image request, the player is only mounted once it is opened
+        if youtube_id is not None:
+            st.image(_THUMBNAIL_URL.format(youtube_id), width=320)
+        st.button(
+            f"▶️ Play from {_format_timestamp(start)}",
+            key=f"open_{player_key}",
+            on_click=self.__open_player,
+            args=(player_key,),
+        )
+
+    @staticmethod
+    def __open_player(player_key):
+        st.session_state.setdefault("open_players", set()).add(player_key)
+
+    def __get_result_info(self, hit):
+        video_id = hit.video_url
+        start = 0 if st.session_state.control else hit.start
+        end = start if st.session_state.control else hit.end
+        category = [tag for tag in hit.tags if tag not in ["base", "11"]]
         category = ", ".join(category)
-        video = results.at[i, "Name"].split("_")[0]
-        similarity = results.at[i, "Similarity"]
-        return video_id, start, content, category, video, similarity
+        video = hit.name.split("_")[0]
+        return video_id, start, end, hit.content, category, video, hit.similarity
@@ -1,11 +1,13 @@
 from .abstract_page import AbstractPage
 import streamlit as st
 
-from video_search.search.semantha import DenseOnlyRanking, SparseFilterDenseRanking, HybridRanking
+from video_search.search.semantha import DenseOnlyRanking, SparseFilterDenseRanking, HybridRanking, \
+    WeightedSimilarityRanking
 
 _DENSE_ONLY_RANKING = "DenseOnlyRanking"
 _SPARSE_FILTER_DENSE_RANKING = "SparseFilterDenseRanking"
 _HYBRID_RANKING = "HybridRanking"
+_WEIGHTED_SIMILARITY_RANKING = "WeightedSimilarityRanking"
 _HORIZONTAL_LINE = (
     """<hr style="height:1px;border:none;color:#333;background-color:#333;" /> """
 )
@@ -23,6 +25,9 @@ class Sidebar(AbstractPage):
         self.__enter_to_submit = True
         self.__debug = False
         self.__filter_duplicates = True
+        self.__max_per_video = None
+        self.__merge_gap = None
+        self.__diversity = None
         self.__show_videos_below_each_other = True
 
     def get_max_matches(self):
@@ -38,6 +43,8 @@ class Sidebar(AbstractPage):
             return SparseFilterDenseRanking
         elif self.__ranking_strategy == _HYBRID_RANKING:
             return HybridRanking
+        elif self.__ranking_strategy == _WEIGHTED_SIMILARITY_RANKING:
+            return WeightedSimilarityRanking
         else:
             raise ValueError(f"Unknown ranking strategy '{self.__ranking_strategy}'")
 
@@ -56,6 +63,15 @@ class Sidebar(AbstractPage):
     def get_filter_duplicates(self):
         return self.__filter_duplicates
 
+    def get_max_per_video(self):
+        return self.__max_per_video
+
+    def get_merge_gap(self):
+        return self.__merge_gap
+
+    def get_diversity(self):
+        return self.__diversity
+
     def get_enter_to_submit(self):
         return self.__enter_to_submit
 
@@ -92,6 +108,16 @@ class Sidebar(AbstractPage):
         self.__filter_duplicates = st.checkbox(
             "Filter Duplicates (Videos Matches w/ Same ID and Timestamp)", value=True
         )
+        # 0 switches the diversification steps off
+        self.__max_per_video = st.slider(
+            "Maximum matches per video", min_value=0, max_value=10, value=0
+        ) or None
+        self.__merge_gap = st.slider(
+            "Merge matches of a video within (seconds)", min_value=0, max_value=120, step=5, value=0
+        ) or None
+        self.__diversity = st.slider(
+            "Diversity", min_value=0.0, max_value=1.0, step=0.05, value=0.0
+        ) or None
         self.__enter_to_submit = st.checkbox(
             "Enable 'Press Enter to Submit'", value=True
         )
@@ -110,16 +136,14 @@ class Sidebar(AbstractPage):
                 "HybridRanking",
                 "DenseOnlyRanking",
                 "SparseFilterDenseRanking",
+                "WeightedSimilarityRanking",
             ],
         )
-        if (
-            self.__ranking_strategy == _SPARSE_FILTER_DENSE_RANKING
-            or self.__ranking_strategy == _HYBRID_RANKING
-        ):
+        if self.get_ranking_strategy().uses_sparse_references:
             self.__filter_size = st.slider(
-                "Sparse filter size", min_value=0, max_value=10, value=10
+                "Sparse filter size", min_value=0, max_value=100, value=10
             )
-        if self.__ranking_strategy == _HYBRID_RANKING:
+        if self.__ranking_strategy in (_HYBRID_RANKING, _WEIGHTED_SIMILARITY_RANKING):
             self.__alpha = st.slider(
                 "Alpha", min_value=0.0, max_value=2.0, step=0.05, value=0.7
             )
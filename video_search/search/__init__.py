@@ -1 +1,5 @@
-from .semantha import Semantha
+def __getattr__(name):
+    if name == "Semantha":
+        from .semantha import Semantha
+        return Semantha
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,61 @@
+import io
+from abc import ABC, abstractmethod
+
+from .client import health_check
+
+
+def _to_text_file(text: str):
+    input_file = io.BytesIO(text.encode("utf-8"))
+    input_file.name = "input.txt"
+    return input_file
+
+
+class RetrievalBackend(ABC):
+    """Where Semantha.query_library gets its references and library documents from.
+
+    References need ``document_id`` and ``similarity``, documents need ``id``, ``name``, ``content_preview``,
+    ``tags`` and ``metadata`` (the stringified metadata dict), like the semantha_sdk models.
+    """
+
+    @abstractmethod
+    def references(self, text: str, tags: str, max_references: int, mode: str, threshold: float = None) -> list:
+        raise NotImplementedError("Abstract method")
+
+    @abstractmethod
+    def documents(self, document_ids, return_fields: str) -> list:
+        raise NotImplementedError("Abstract method")
+
+    def health_check(self) -> bool:
+        return True
+
+
+class SemanthaBackend(RetrievalBackend):
+
+    def __init__(self, sdk, domain: str):
+        self.__sdk = sdk
+        self.__domain = domain
+
+    def references(self, text: str, tags: str, max_references: int, mode: str, threshold: float = None) -> list:
+        kwargs = {} if threshold is None else {"similarity_threshold": threshold}
+        return self.__sdk.domains(self.__domain).references.post(
+            file=_to_text_file(text),
+            max_references=max_references,
+            with_context=False,
+            tags=tags,
+            mode=mode,
+            **kwargs
+        ).references
+
+    def documents(self, document_ids, return_fields: str) -> list:
+        document_ids = list(document_ids)
+        if len(document_ids) == 0:
+            return []
+        library = self.__sdk.domains(self.__domain).reference_documents \
+            .get(offset=0,
+                 limit=len(document_ids),
+                 filter_document_ids=",".join(document_ids),
+                 return_fields=return_fields)
+        return [] if library is None else library.documents
+
+    def health_check(self) -> bool:
+        return health_check(self.__sdk)
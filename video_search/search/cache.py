@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after insertion.
+
+    If ``max_bytes`` is set, entries are also evicted once the sizes passed to ``put`` add up to more than that.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: int = None):
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__max_bytes = max_bytes
+        self.__data = OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    def get(self, key, default=None):
+        with self.__lock:
+            entry = self.__data.get(key)
+            if entry is None or entry[0] < monotonic():
+                if entry is not None:
+                    self.__remove(key)
+                self.__misses += 1
+                return default
+            self.__data.move_to_end(key)
+            self.__hits += 1
+            return entry[1]
+
+    def put(self, key, value, size: int = 0) -> None:
+        if self.__maxsize <= 0 or (self.__max_bytes is not None and size > self.__max_bytes):
+            return
+        with self.__lock:
+            if key in self.__data:
+                self.__remove(key)
+            self.__data[key] = (monotonic() + self.__ttl, value, size)
+            self.__bytes += size
+            while len(self.__data) > self.__maxsize or (
+                self.__max_bytes is not None and self.__bytes > self.__max_bytes
+            ):
+                self.__remove(next(iter(self.__data)))
+
+    def invalidate(self, predicate=None) -> int:
+        with self.__lock:
+            if predicate is None:
+                removed = len(self.__data)
+                self.__data.clear()
+                self.__bytes = 0
+                return removed
+            keys = [key for key in self.__data if predicate(key)]
+            for key in keys:
+                self.__remove(key)
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "size": len(self.__data),
+                "maxsize": self.__maxsize,
+                "bytes": self.__bytes,
+                "max_bytes": self.__max_bytes,
+                "ttl": self.__ttl,
+                "hits": self.__hits,
+                "misses": self.__misses,
+            }
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__data)
+
+    def __remove(self, key) -> None:
+        self.__bytes -= self.__data.pop(key)[2]
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Lets concurrent callers of the same key share one computation.
+
+    The first caller of ``join`` becomes the leader and has to call ``finish`` with the result (or None if it gave
+    up), the others ``wait`` for it.
+    """
+
+    def __init__(self):
+        self.__flights = {}
+        self.__lock = threading.Lock()
+        self.__coalesced = 0
+
+    def join(self, key) -> tuple:
+        with self.__lock:
+            flight = self.__flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.__coalesced += 1
+                return flight, False
+            flight = self.__flights[key] = _Flight()
+            return flight, True
+
+    def finish(self, key, flight: _Flight, result) -> None:
+        with self.__lock:
+            if self.__flights.get(key) is flight:
+                del self.__flights[key]
+        flight.result = result
+        flight.done.set()
+
+    @staticmethod
+    def wait(flight: _Flight, timeout: float = None):
+        flight.done.wait(timeout)
+        return flight.result
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {"in_flight": len(self.__flights), "coalesced": self.__coalesced}
+
+
+_shared = {}
+_shared_key_locks = {}
+_shared_lock = threading.Lock()
+
+
+def shared(key, factory):
+    """The object ``factory()`` created for ``key``, created once per process.
+
+    Module level state outlives Streamlit reruns and is shared by all sessions of the process. Only callers of the
+    same key wait for a slow factory (e.g. a login), a factory that raises is called again by the next caller.
+    """
+    with _shared_lock:
+        if key in _shared:
+            return _shared[key]
+        key_lock = _shared_key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        with _shared_lock:
+            if key in _shared:
+                return _shared[key]
+        value = factory()
+        with _shared_lock:
+            _shared[key] = value
+        return value
+
+
+def shared_cache(name: str, maxsize: int, ttl: float, max_bytes: int = None) -> TTLCache:
+    return shared(("cache", name), lambda: TTLCache(maxsize, ttl, max_bytes))
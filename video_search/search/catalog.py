@@ -0,0 +1,95 @@
+import json
+import os
+from typing import FrozenSet, NamedTuple, Optional
+
+import numpy as np
+
+from .cache import shared
+from .metadata import ReferenceMetadata, parse_video_id
+
+_TABLES = "tables.json"
+_ARRAYS = ("document_ids", "video", "start", "name", "tags")
+
+
+class CatalogEntry(NamedTuple):
+    video_id: Optional[str]
+    url: str
+    start: int
+    name: str
+    tags: FrozenSet[str]
+
+    def reference_metadata(self) -> ReferenceMetadata:
+        return ReferenceMetadata({"id": self.url, "start": self.start}, self.video_id, self.start)
+
+
+class Catalog:
+    """Read-only mapping of document id to (video, start, name, tags), so hits need no metadata requests.
+
+    Stored as a directory of .npy arrays (document ids sorted for binary search, the other columns index into the
+    string tables of tables.json) that are memory-mapped on load.
+    """
+
+    def __init__(self, arrays: dict, tables: dict):
+        self.__arrays = arrays
+        self.__document_ids = arrays["document_ids"]
+        self.__video = arrays["video"]
+        self.__start = arrays["start"]
+        self.__name = arrays["name"]
+        self.__tags = arrays["tags"]
+        self.__tables = tables
+        self.__videos = [tuple(video) for video in tables["videos"]]
+        self.__tag_sets = [frozenset(tags) for tags in tables["tag_sets"]]
+
+    @classmethod
+    def build(cls, documents):
+        """``documents`` yields (document id, name, tags, metadata dict) like the library or a domain export."""
+        rows = sorted(documents, key=lambda document: document[0])
+        videos, names, tag_sets = {}, {}, {}
+        columns = {"video": [], "start": [], "name": [], "tags": []}
+        for _, name, tags, metadata in rows:
+            url = metadata["id"]
+            columns["video"].append(videos.setdefault((parse_video_id(url), url), len(videos)))
+            columns["start"].append(int(metadata.get("start", 0)))
+            columns["name"].append(names.setdefault(name, len(names)))
+            columns["tags"].append(tag_sets.setdefault(tuple(sorted(tags)), len(tag_sets)))
+        arrays = {
+            "document_ids": np.array([row[0].encode("utf-8") for row in rows], dtype=bytes),
+            **{column: np.array(values, dtype=np.int32) for column, values in columns.items()},
+        }
+        tables = {"videos": list(videos), "names": list(names), "tag_sets": list(tag_sets)}
+        return cls(arrays, tables)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, _TABLES), encoding="utf-8") as f:
+            tables = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+        return cls(arrays, tables)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), self.__arrays[name])
+        with open(os.path.join(path, _TABLES), "w", encoding="utf-8") as f:
+            json.dump(self.__tables, f, ensure_ascii=False)
+
+    def get(self, document_id: str) -> Optional[CatalogEntry]:
+        key = document_id.encode("utf-8")
+        i = int(np.searchsorted(self.__document_ids, key))
+        if i == len(self.__document_ids) or self.__document_ids[i] != key:
+            return None
+        video_id, url = self.__videos[self.__video[i]]
+        return CatalogEntry(
+            video_id, url, int(self.__start[i]), self.__tables["names"][self.__name[i]], self.__tag_sets[self.__tags[i]]
+        )
+
+    def __contains__(self, document_id: str) -> bool:
+        return self.get(document_id) is not None
+
+    def __len__(self):
+        return len(self.__document_ids)
+
+
+def shared_catalog(path: str) -> Catalog:
+    # the arrays stay memory-mapped
+    return shared(("catalog", path), lambda: Catalog.load(path))
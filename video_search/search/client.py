@@ -0,0 +1,167 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+from requests import Request, Session
+from requests.adapters import HTTPAdapter
+
+from .cache import shared
+from .tracing import count_http_request, span
+
+if TYPE_CHECKING:
+    from semantha_sdk.api.semantha_api import SemanthaAPI
+    from semantha_sdk.response.semantha_response import SemanthaPlatformResponse
+
+_API_ROOT = "/api/v3"
+
+
+class _PooledRequest:
+
+    def __init__(self, session: Session, prepared_request, timeout: float = None):
+        self.__session = session
+        self.__prepared_request = prepared_request
+        self.__timeout = timeout
+
+    def execute(self) -> "SemanthaPlatformResponse":
+        # the SDK takes a while to import, it is loaded with the first request instead of at startup
+        from semantha_sdk.response.semantha_response import SemanthaPlatformResponse
+        count_http_request()
+        with span(f"http.{self.__prepared_request.method}"):
+            return SemanthaPlatformResponse(self.__session.send(self.__prepared_request, timeout=self.__timeout))
+
+
+class PooledRestClient:
+    """Drop-in replacement for the SDK's RestClient.
+
+    The SDK opens a new ``requests.Session`` for every request, which means a new TCP connection and TLS handshake
+    per call. This client sends everything through one keep-alive session with a bounded connection pool instead.
+    Requests that take longer than ``timeout`` seconds to connect or to send data raise ``requests.Timeout``.
+    """
+
+    def __init__(self, server_url: str, api_key: str, pool_size: int, timeout: float = None):
+        self.__server_url = server_url
+        self.__api_key = api_key
+        self.__timeout = timeout
+        self.__session = Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.__session.mount("https://", adapter)
+        self.__session.mount("http://", adapter)
+
+    def __build_headers_for_json_request(self) -> dict:
+        return {
+            'Accept': 'application/json',
+            'Authorization': f'Bearer {self.__api_key}'
+        }
+
+    def __request(self, method, url, files=None, params=None, json=None) -> _PooledRequest:
+        request = Request(
+            method=method,
+            url=self.__server_url + url,
+            headers=self.__build_headers_for_json_request(),
+            files=files,
+            params=params,
+            json=json
+        )
+        return _PooledRequest(self.__session, self.__session.prepare_request(request), self.__timeout)
+
+    def get(self, url: str, q_params: dict = None) -> _PooledRequest:
+        return self.__request("GET", url, params=q_params)
+
+    def post(self, url: str, body: dict = None, json: dict = None, q_params: dict = None) -> _PooledRequest:
+        if body is None and json is None:
+            raise ValueError("Either a body (files/form-data) or a json must be provided!")
+        return self.__request("POST", url, files=body, json=json, params=q_params)
+
+    def delete(self, url: str, q_params: dict = None, json=None) -> _PooledRequest:
+        return self.__request("DELETE", url, params=q_params, json=json)
+
+    def patch(self, url: str, body: dict = None, json=None, q_params: dict = None) -> _PooledRequest:
+        if body is None and json is None:
+            raise ValueError("Either a body (files/form-data) or a json must be provided!")
+        return self.__request("PATCH", url, files=body, json=json, params=q_params)
+
+    def put(self, url: str, body: dict = None, json: dict = None, q_params: dict = None) -> _PooledRequest:
+        if body is None and json is None:
+            raise ValueError("Either a body (files/form-data) or a json must be provided!")
+        return self.__request("PUT", url, files=body, json=json, params=q_params)
+
+
+def get_client(server_url: str, api_key: str, pool_size: int = 16, timeout: float = None) -> "SemanthaAPI":
+    # one logged in client per server, key and timeout for the whole process
+    return shared(("client", server_url, api_key, timeout), lambda: _connect(server_url, api_key, pool_size, timeout))
+
+
+def _connect(server_url: str, api_key: str, pool_size: int, timeout: float) -> "SemanthaAPI":
+    from semantha_sdk.api.semantha_api import SemanthaAPI
+    sdk = SemanthaAPI(PooledRestClient(server_url, api_key, pool_size, timeout), _API_ROOT)
+    # checks the API key like semantha_sdk.login and opens the first keep-alive connection
+    sdk.current_user.get()
+    logging.info(f"Connected to {server_url} with a pool of {pool_size} connections.")
+    return sdk
+
+
+class DeferredClient:
+    """Stands in for the client of ``get_client`` while it logs in on a background thread.
+
+    Attribute access waits for the login, so the page can render in the meantime. A failed login is raised to the
+    caller that waited for it and started again for the next one.
+    """
+
+    def __init__(self, server_url: str, api_key: str, pool_size: int = 16, timeout: float = None):
+        self.__arguments = {"server_url": server_url, "api_key": api_key, "pool_size": pool_size, "timeout": timeout}
+        self.__lock = threading.Lock()
+        self.__future = self.__connect()
+
+    def __connect(self) -> Future:
+        future = Future()
+
+        def connect():
+            try:
+                future.set_result(get_client(**self.__arguments))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=connect, name="semantha-login", daemon=True).start()
+        return future
+
+    def __getattr__(self, name):
+        with self.__lock:
+            future = self.__future
+        try:
+            sdk = future.result()
+        except Exception:
+            with self.__lock:
+                if self.__future is future:
+                    self.__future = self.__connect()
+            raise
+        return getattr(sdk, name)
+
+
+def health_check(sdk: "SemanthaAPI") -> bool:
+    try:
+        sdk.current_user.get()
+        return True
+    except Exception as e:
+        logging.warning(f"Semantha health check failed: {e}")
+        return False
+
+
+def with_retries(call, attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+    """Calls ``call()`` until it succeeds, backing off exponentially with jitter between attempts.
+
+    Client errors (bad request, missing permission, not found) are raised right away.
+    """
+    for attempt in range(attempts):
+        try:
+            return call()
+        except (ValueError, PermissionError, FileNotFoundError):
+            raise
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+            logging.warning(f"Attempt {attempt + 1} of {attempts} failed ({e}), retrying in {delay:.1f} seconds.")
+            time.sleep(delay)
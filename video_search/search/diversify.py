@@ -0,0 +1,112 @@
+import re
+from collections import Counter
+
+from .results import SearchHit
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _video_key(hit: SearchHit) -> str:
+    return hit.metadata.video_id or hit.video_url
+
+
+def cap_per_video(hits, max_per_video: int):
+    """Passes hits through in order, skipping those of videos that already had ``max_per_video`` hits."""
+    counts = Counter()
+    for hit in hits:
+        key = _video_key(hit)
+        if counts[key] < max_per_video:
+            counts[key] += 1
+            yield hit
+
+
+def unique_urls(hits):
+    """Passes hits through in order, skipping those with the video url of an earlier hit."""
+    seen = set()
+    for hit in hits:
+        if hit.video_url not in seen:
+            seen.add(hit.video_url)
+            yield hit
+
+
+def merge_adjacent(hits: list, max_gap: float) -> list:
+    """Merges hits of the same video that start at most ``max_gap`` seconds apart into one hit.
+
+    The merged hit is the best ranked hit of the run, starting at the earliest and ending at the latest window, and
+    keeps that hit's rank.
+    """
+    rank = {id(hit): i for i, hit in enumerate(hits)}
+    by_video = {}
+    for hit in hits:
+        by_video.setdefault(_video_key(hit), []).append(hit)
+
+    merged = []
+    for video_hits in by_video.values():
+        video_hits.sort(key=lambda hit: hit.start)
+        run = [video_hits[0]]
+        for hit in video_hits[1:]:
+            if hit.start - run[-1].end <= max_gap:
+                run.append(hit)
+            else:
+                merged.append(_merge_run(run, rank))
+                run = [hit]
+        merged.append(_merge_run(run, rank))
+    merged.sort(key=lambda pair: pair[0])
+    return [hit for _, hit in merged]
+
+
+def _merge_run(run: list, rank: dict) -> tuple:
+    best = min(run, key=lambda hit: rank[id(hit)])
+    if len(run) == 1:
+        return rank[id(best)], best
+    start = min(hit.start for hit in run)
+    end = max(hit.end for hit in run)
+    return rank[id(best)], SearchHit(
+        best.document_id, best.name, best.content, best.similarity, best.metadata._replace(start=start), best.tags,
+        end=end,
+    )
+
+
+def mmr(hits: list, max_results: int, diversity: float, max_per_video: int = None) -> list:
+    """Maximal marginal relevance: greedily picks the hit with the best trade-off of similarity and novelty.
+
+    Two hits are redundant if they come from the same video or share most of their words (Jaccard similarity).
+    ``diversity`` 0 keeps the ranking, 1 only looks at novelty.
+    """
+    tokens = [frozenset(_TOKEN.findall(hit.content.casefold())) for hit in hits]
+    keys = [_video_key(hit) for hit in hits]
+    counts = Counter()
+    redundancy = [0.0] * len(hits)
+    remaining = set(range(len(hits)))
+    selected = []
+    while remaining and len(selected) < max_results:
+        best = max(
+            remaining,
+            key=lambda i: ((1 - diversity) * hits[i].similarity / 100 - diversity * redundancy[i], -i),
+        )
+        remaining.discard(best)
+        if max_per_video is not None and counts[keys[best]] >= max_per_video:
+            continue
+        counts[keys[best]] += 1
+        selected.append(hits[best])
+        for i in remaining:
+            if keys[i] == keys[best]:
+                redundancy[i] = 1.0
+            elif redundancy[i] < 1.0:
+                union = len(tokens[i] | tokens[best])
+                if union > 0:
+                    redundancy[i] = max(redundancy[i], len(tokens[i] & tokens[best]) / union)
+    return selected
+
+
+def diversify(hits: list, max_results: int, merge_gap: float = None, max_per_video: int = None,
+              diversity: float = None, filter_duplicates: bool = False) -> list:
+    if merge_gap is not None:
+        hits = merge_adjacent(hits, merge_gap)
+    if filter_duplicates:
+        hits = list(unique_urls(hits))
+    if diversity is not None:
+        return mmr(hits, max_results, diversity, max_per_video)
+    if max_per_video is not None:
+        hits = cap_per_video(hits, max_per_video)
+    return list(hits)[:max_results]
@@ -0,0 +1,41 @@
+import ast
+
+from .client import with_retries
+
+# tags of the documents uploaded by video_search.ingest
+MANAGED_TAGS = "TRANSCRIPT_LEVEL,SENTENCE_LEVEL"
+_PAGE_SIZE = 1000
+
+
+def iter_domain_documents(sdk, domain: str, return_fields: str):
+    """(document, metadata dict) of every transcript and segment document in the domain, fetched page by page."""
+    offset = 0
+    while True:
+        page = with_retries(lambda: sdk.domains(domain).reference_documents.get(
+            offset=offset, limit=_PAGE_SIZE, filter_tags=MANAGED_TAGS, return_fields=return_fields
+        ))
+        for doc in page.documents:
+            try:
+                metadata = ast.literal_eval(doc.metadata) if doc.metadata else {}
+            except (ValueError, SyntaxError):
+                metadata = {}
+            yield doc, metadata
+        if len(page.documents) < _PAGE_SIZE:
+            return
+        offset += _PAGE_SIZE
+
+
+def add_connection_arguments(parser) -> None:
+    parser.add_argument('--server-url', type=str, default=None, help='defaults to the streamlit secrets')
+    parser.add_argument('--api-key', type=str, default=None, help='defaults to the streamlit secrets')
+    parser.add_argument('--domain', type=str, default=None, help='defaults to the streamlit secrets')
+
+
+def fill_connection_arguments(args) -> None:
+    # the command line wins over the streamlit secrets
+    if args.server_url is None or args.api_key is None or args.domain is None:
+        import streamlit as st
+        semantha_secrets = st.secrets["semantha"]
+        args.server_url = args.server_url or semantha_secrets["base_url"]
+        args.api_key = args.api_key or semantha_secrets["api_key"]
+        args.domain = args.domain or semantha_secrets["domain"]
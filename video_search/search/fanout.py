@@ -0,0 +1,227 @@
+import dataclasses
+import heapq
+import itertools
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from time import perf_counter
+from typing import NamedTuple
+
+import numpy as np
+
+from .cache import shared
+from .semantha import HybridRanking, RankingStrategy, Semantha, _streamlit
+from .tracing import Trace, run_traced, span
+
+_SCORE_WINDOW = 1024
+# similarities are percentages, keeps a domain with nearly constant scores from dominating the merge
+_MIN_SCORE_STD = 5.0
+_MIN_SCORE_SAMPLES = 50
+
+
+class DomainHit(NamedTuple):
+    domain: str
+    score: float
+    hit: object
+
+
+class FanOutResult(NamedTuple):
+    hits: list
+    # domain -> "timeout" or the error, for the domains that are missing from the hits
+    failed: dict
+
+    @property
+    def partial(self) -> bool:
+        return len(self.failed) > 0
+
+
+class _ScoreWindow:
+    # the recent similarities of one domain
+    def __init__(self):
+        self.__similarities = deque(maxlen=_SCORE_WINDOW)
+        self.__lock = threading.Lock()
+
+    def add(self, similarities: np.ndarray) -> np.ndarray:
+        with self.__lock:
+            self.__similarities.extend(similarities.tolist())
+            return np.fromiter(self.__similarities, dtype=np.float64)
+
+
+def _score_window(domain: str) -> _ScoreWindow:
+    # one window per domain for the whole process, every session and rerun adds to the same statistics
+    return shared(("score_window", domain), _ScoreWindow)
+
+
+class ScoreNormalizer:
+    """Maps the similarities of each domain to z-scores over the recent similarities of that domain.
+
+    Each domain has its own embedding space and threshold, so raw similarities of different domains do not compare.
+    Until every merged domain has ``_MIN_SCORE_SAMPLES`` similarities the raw similarities are merged, z-scores over a
+    handful of hits would rank each domain's best hit first no matter how well it matches.
+    """
+
+    def __init__(self, method: str = "zscore"):
+        if method not in ("zscore", "none"):
+            raise ValueError(f"Unknown score normalization '{method}'")
+        self.__method = method
+
+    def normalize(self, similarities: dict) -> dict:
+        """Maps domain -> similarities to domain -> scores that compare across the domains."""
+        similarities = {
+            domain: np.asarray(values, dtype=np.float64) for domain, values in similarities.items() if len(values) > 0
+        }
+        if self.__method == "none":
+            return similarities
+        histories = {domain: _score_window(domain).add(values) for domain, values in similarities.items()}
+        if any(len(history) < _MIN_SCORE_SAMPLES for history in histories.values()):
+            return similarities
+        return {
+            domain: (values - histories[domain].mean()) / max(histories[domain].std(), _MIN_SCORE_STD)
+            for domain, values in similarities.items()
+        }
+
+
+def _fanout_pool(max_workers: int) -> ThreadPoolExecutor:
+    # separate from the retrieval pool, the domain searches wait for their retrieval tasks
+    return shared("fanout_pool", lambda: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout"))
+
+
+def merge_top_k(ranked_hits: dict, normalizer: ScoreNormalizer, max_matches: int,
+                filter_duplicates: bool = False, max_per_video: int = None) -> list:
+    """Merges the ranked SearchHits of every domain into one list of at most ``max_matches`` DomainHits.
+
+    ``filter_duplicates`` keeps at most ``max_per_video`` (default 1) hits per video url across the domains.
+    """
+    normalized = normalizer.normalize(
+        {domain: [hit.similarity for hit in hits] for domain, hits in ranked_hits.items()})
+    streams = []
+    for domain, scores in normalized.items():
+        hits = ranked_hits[domain]
+        # keeps each domain's own order (e.g. hybrid ranking), a hit never scores above the one ranked before it
+        scores = np.minimum.accumulate(scores)
+        streams.append([DomainHit(domain, score, hit) for score, hit in zip(scores.tolist(), hits)])
+    merged = heapq.merge(*streams, key=lambda domain_hit: -domain_hit.score)
+    if filter_duplicates:
+        # the same video can be in the library of several domains
+        merged = _cap_videos(merged, 1 if max_per_video is None else max_per_video)
+    return list(itertools.islice(merged, max_matches))
+
+
+def _cap_videos(domain_hits, max_per_video: int):
+    # same rule as the filter_duplicates of each domain's search
+    counts = Counter()
+    for domain_hit in domain_hits:
+        if counts[domain_hit.hit.video_url] < max_per_video:
+            counts[domain_hit.hit.video_url] += 1
+            yield domain_hit
+
+
+class MultiDomainSemantha:
+    """Searches several domains (or local libraries) in parallel and merges their hits into one ranking.
+
+    Has the search interface of Semantha, ``search`` additionally reports the domains that timed out or failed.
+    """
+
+    def __init__(self, searches: dict, timeout: float = 5.0, normalization: str = "zscore", workers: int = 8):
+        self.__searches = searches
+        self.__timeout = timeout
+        self.__normalizer = ScoreNormalizer(normalization)
+        self.__pool = _fanout_pool(workers)
+        self.__last_trace = None
+
+    def search(self,
+               text: str,
+               tags: str,
+               threshold: float = 0.7,
+               max_matches: int = 3,
+               ranking_strategy: RankingStrategy.__class__ = HybridRanking,
+               sparse_filter_size: int = 5,
+               alpha=0.7,
+               filter_duplicates=False,
+               control: bool = None,
+               max_per_video: int = None,
+               merge_gap: float = None,
+               diversity: float = None) -> FanOutResult:
+        if control is None:
+            # the session is not available on the pool threads
+            control = bool(_streamlit().session_state.control)
+        trace = Trace(text)
+        self.__last_trace = trace
+        arguments = (text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size, alpha,
+                     filter_duplicates, control, max_per_video, merge_gap, diversity)
+        deadline = perf_counter() + self.__timeout
+        futures = {
+            domain: self.__pool.submit(run_traced, trace, self.__search_domain, domain, search, arguments)
+            for domain, search in self.__searches.items()
+        }
+        ranked_hits = {}
+        failed = {}
+        for domain, future in futures.items():
+            try:
+                # every domain gets the same deadline, waiting for one does not shorten the time of the others
+                ranked_hits[domain] = future.result(timeout=max(0.0, deadline - perf_counter()))
+            except TimeoutError:
+                # keeps running and fills the domain's result cache for the next query
+                failed[domain] = "timeout"
+            except Exception as e:
+                failed[domain] = str(e) or type(e).__name__
+        if failed:
+            logging.warning(f"Search query: '{text}' is missing the results of {failed}.")
+        hits = run_traced(trace, self.__merge, ranked_hits, max_matches, filter_duplicates, max_per_video)
+        return FanOutResult(hits, failed)
+
+    def __merge(self, ranked_hits: dict, max_matches: int, filter_duplicates: bool, max_per_video: int) -> list:
+        with span("merge"):
+            return merge_top_k(ranked_hits, self.__normalizer, max_matches, filter_duplicates, max_per_video)
+
+    @staticmethod
+    def __search_domain(domain: str, search: Semantha, arguments: tuple) -> list:
+        with span(f"domain.{domain}"):
+            return search.query_library(*arguments)
+
+    def query_library(self, text: str, tags: str, *args, **kwargs) -> list:
+        return [domain_hit.hit for domain_hit in self.search(text, tags, *args, **kwargs).hits]
+
+    def iter_query_library(self, text: str, tags: str, *args, **kwargs):
+        # the merge needs the hits of every domain, so nothing goes out before the slowest domain answered
+        yield from self.query_library(text, tags, *args, **kwargs)
+
+    def get_last_trace(self) -> Trace:
+        return self.__last_trace
+
+    def health_check(self) -> bool:
+        # partial results are still results
+        return any(search.health_check() for search in self.__searches.values())
+
+    def track_usage(self, content: str, tag: str) -> None:
+        # all domains share the tracking domain of the secrets
+        next(iter(self.__searches.values())).track_usage(content, tag)
+
+    def get_tracking_stats(self) -> dict:
+        return next(iter(self.__searches.values())).get_tracking_stats()
+
+    def get_result_cache_stats(self) -> dict:
+        return {domain: search.get_result_cache_stats() for domain, search in self.__searches.items()}
+
+    def invalidate_result_cache(self) -> int:
+        return sum(search.invalidate_result_cache() for search in self.__searches.values())
+
+
+def create_search(demo_config, secrets=None):
+    """Semantha for a single domain, MultiDomainSemantha if the demo config lists several."""
+    domains = [domain.strip() for domain in (demo_config.domains or "").split(",") if domain.strip()]
+    if len(domains) == 0:
+        return Semantha(demo_config, secrets=secrets)
+    if demo_config.retrieval_backend == "local":
+        searches = {
+            domain: Semantha(dataclasses.replace(demo_config, local_library_path=domain), secrets=secrets)
+            for domain in domains
+        }
+    else:
+        secrets = dict(secrets if secrets is not None else _streamlit().secrets["semantha"])
+        searches = {domain: Semantha(demo_config, secrets={**secrets, "domain": domain}) for domain in domains}
+    if len(searches) == 1:
+        return next(iter(searches.values()))
+    return MultiDomainSemantha(searches, demo_config.domain_timeout, demo_config.score_normalization,
+                               demo_config.fanout_workers)
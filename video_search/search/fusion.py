@@ -0,0 +1,61 @@
+import numpy as np
+
+_NO_VIDEO = -1
+
+
+def encode_video_ids(dense_video_ids, sparse_video_ids):
+    """Map the video ids of both result lists to dense integer codes.
+
+    References without a video id get the code -1 and never match anything.
+    Returns the codes of the dense and the sparse list and the number of distinct videos.
+    """
+    # dict.fromkeys keeps the first occurrence order, the lookups below run in C instead of a Python loop
+    codes = {video_id: code for code, video_id in enumerate(dict.fromkeys([*dense_video_ids, *sparse_video_ids]))}
+    codes[None] = _NO_VIDEO
+    dense_codes = np.fromiter(map(codes.__getitem__, dense_video_ids), dtype=np.int64, count=len(dense_video_ids))
+    sparse_codes = np.fromiter(map(codes.__getitem__, sparse_video_ids), dtype=np.int64, count=len(sparse_video_ids))
+    return dense_codes, sparse_codes, len(codes)
+
+
+def first_positions(codes: np.ndarray, n_codes: int) -> np.ndarray:
+    # position of the first occurrence of every code, -1 if it does not occur
+    positions = np.full(n_codes + 1, _NO_VIDEO, dtype=np.int64)
+    known = codes != _NO_VIDEO
+    unique_codes, first_index = np.unique(codes[known], return_index=True)
+    positions[unique_codes] = np.flatnonzero(known)[first_index]
+    # code -1 indexes the extra last slot, which always stays -1
+    return positions
+
+
+def reciprocal_rank_fusion(dense_codes: np.ndarray, sparse_codes: np.ndarray, n_codes: int, alpha: float):
+    """Order of the dense results by 1/(dense rank) + alpha/(rank of the video in the sparse results)."""
+    sparse_rank = first_positions(sparse_codes, n_codes)[dense_codes]
+    scores = 1.0 / np.arange(1, len(dense_codes) + 1)
+    matched = sparse_rank != _NO_VIDEO
+    scores[matched] += alpha / (sparse_rank[matched] + 1)
+    return _descending(scores)
+
+
+def weighted_similarity_fusion(dense_codes: np.ndarray,
+                               dense_similarities: np.ndarray,
+                               sparse_codes: np.ndarray,
+                               sparse_similarities: np.ndarray,
+                               n_codes: int,
+                               alpha: float):
+    """Order of the dense results by dense similarity + alpha * (best sparse similarity of the same video)."""
+    sparse_position = first_positions(sparse_codes, n_codes)[dense_codes]
+    scores = np.asarray(dense_similarities, dtype=np.float64).copy()
+    matched = sparse_position != _NO_VIDEO
+    # the sparse results are sorted by similarity, the first hit of a video is its best one
+    scores[matched] += alpha * np.asarray(sparse_similarities, dtype=np.float64)[sparse_position[matched]]
+    return _descending(scores)
+
+
+def sparse_filter(dense_codes: np.ndarray, sparse_codes: np.ndarray):
+    """Indices of the dense results whose video is among the sparse results, in dense order."""
+    return np.flatnonzero(np.isin(dense_codes, sparse_codes[sparse_codes != _NO_VIDEO]))
+
+
+def _descending(scores: np.ndarray):
+    # stable, so equally scored results keep their dense order
+    return np.argsort(-scores, kind="stable")
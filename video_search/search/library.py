@@ -0,0 +1,52 @@
+import ast
+import os
+from typing import List, NamedTuple
+from urllib.parse import urlparse, parse_qs
+
+# tags written by video_transcription/run.py and the tags the search uses in the Semantha domain
+_TAG_LEVELS = {"TRANSCRIPT": "TRANSCRIPT_LEVEL", "SEGMENT": "SENTENCE_LEVEL"}
+
+
+class LibraryRow(NamedTuple):
+    id: str
+    name: str
+    content: str
+    tags: List[str]
+    metadata: dict
+
+
+def load_library(library_path: str) -> list:
+    """Rows of a library written by video_transcription/run.py, a directory or a spreadsheet.
+
+    Tags and metadata are converted to what the search expects in the Semantha domain.
+    """
+    if os.path.isdir(library_path):
+        from video_transcription.library import read_library
+        library = list(read_library(library_path))
+    else:
+        import pandas as pd
+        library = pd.read_excel(library_path).to_dict("records")
+    return [
+        LibraryRow(
+            id=row["row_id"] if isinstance(row.get("row_id"), str) else f"local-{i}",
+            name=row["Name"],
+            content=str(row["Content"]),
+            tags=_convert_tags(row["Tags"]),
+            metadata=_convert_metadata(row["Metadata"]),
+        )
+        for i, row in enumerate(library)
+    ]
+
+
+def _convert_tags(tags: str) -> list:
+    return [_TAG_LEVELS.get(tag, tag) for tag in (t.strip() for t in str(tags).split(",")) if tag]
+
+
+def _convert_metadata(metadata) -> dict:
+    # run.py stores the url with a &t= offset, the search expects the video url as "id" and the offset as "start"
+    metadata = ast.literal_eval(metadata) if isinstance(metadata, str) else dict(metadata)
+    if "id" not in metadata and "url" in metadata:
+        query_params = parse_qs(urlparse(metadata["url"]).query)
+        metadata["id"] = f"https://www.youtube.com/watch?v={query_params['v'][0]}"
+        metadata["start"] = int(query_params.get("t", ["0s"])[0].rstrip("s"))
+    return metadata
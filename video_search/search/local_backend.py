@@ -0,0 +1,180 @@
+import logging
+import os
+import re
+import zlib
+from typing import List, NamedTuple
+
+import numpy as np
+
+from .backends import RetrievalBackend
+from .cache import shared
+from .library import load_library
+
+_TOKEN = re.compile(r"\w+")
+
+
+class LocalReference(NamedTuple):
+    document_id: str
+    similarity: float
+
+
+class LocalDocument(NamedTuple):
+    id: str
+    name: str
+    tags: List[str]
+    metadata: str
+    content_preview: str
+
+
+class HashingTfidfEmbedder:
+    """Dependency free fallback: TF-IDF over hashed tokens, L2 normalized."""
+
+    def __init__(self, dimensions: int = 2048):
+        self.name = f"tfidf{dimensions}"
+        self.__dimensions = dimensions
+        self.__idf = np.ones(dimensions, dtype=np.float32)
+
+    def fit(self, texts) -> None:
+        document_frequency = np.zeros(self.__dimensions, dtype=np.float64)
+        for text in texts:
+            document_frequency[np.unique(self.__buckets(text))] += 1
+        self.__idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        np.save(path, self.__idf)
+
+    def load(self, path: str) -> None:
+        self.__idf = np.load(path)
+
+    def encode(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.__dimensions), dtype=np.float32)
+        for i, text in enumerate(texts):
+            counts = np.bincount(self.__buckets(text), minlength=self.__dimensions)
+            nonzero = counts > 0
+            vectors[i, nonzero] = 1 + np.log(counts[nonzero])
+        vectors *= self.__idf
+        return _normalize(vectors)
+
+    def __buckets(self, text: str) -> np.ndarray:
+        return np.array(
+            [zlib.crc32(token.encode("utf-8")) % self.__dimensions for token in _TOKEN.findall(text.casefold())],
+            dtype=np.int64,
+        )
+
+
+class SentenceTransformerEmbedder:
+    """CPU embedding model, requires the optional sentence-transformers package."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.name = re.sub(r"\W+", "_", model_name)
+        self.__model = SentenceTransformer(model_name, device="cpu")
+
+    def fit(self, texts) -> None:
+        pass
+
+    def save(self, path: str) -> None:
+        pass
+
+    def load(self, path: str) -> None:
+        pass
+
+    def encode(self, texts) -> np.ndarray:
+        return _normalize(np.asarray(self.__model.encode(list(texts)), dtype=np.float32))
+
+
+def create_embedder(model_name: str = None):
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            logging.warning(f"sentence-transformers is not installed, falling back to TF-IDF instead of {model_name}.")
+    return HashingTfidfEmbedder()
+
+
+class LocalBackend(RetrievalBackend):
+    """Serves searches from the library written by video_transcription/run.py (directory or spreadsheet).
+
+    The embedding matrix is built once next to the library and memory-mapped on every later start.
+    """
+
+    def __init__(self, library_path: str, embedder=None):
+        self.__embedder = embedder or HashingTfidfEmbedder()
+        self.__documents = _load_library(library_path)
+        self.__positions = {doc.id: i for i, doc in enumerate(self.__documents)}
+        self.__tags = [set(doc.tags) for doc in self.__documents]
+        self.__matrix = self.__load_index(library_path)
+        logging.info(f"Loaded {len(self.__documents)} library documents from {library_path}.")
+
+    def references(self, text: str, tags: str, max_references: int, mode: str, threshold: float = None) -> list:
+        candidates = np.flatnonzero([_matches_tags(row_tags, tags) for row_tags in self.__tags])
+        if len(candidates) == 0 or max_references <= 0:
+            return None
+        query = self.__embedder.encode([text])[0]
+        scores = np.asarray(self.__matrix @ query)[candidates]
+        if len(candidates) > max_references:
+            top = np.argpartition(-scores, max_references - 1)[:max_references]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if threshold is not None:
+            top = top[scores[top] >= threshold]
+        if len(top) == 0:
+            return None
+        return [LocalReference(self.__documents[candidates[i]].id, float(scores[i])) for i in top]
+
+    def documents(self, document_ids, return_fields: str) -> list:
+        return [self.__documents[self.__positions[i]] for i in document_ids if i in self.__positions]
+
+    def __load_index(self, library_path: str):
+        if os.path.isdir(library_path):
+            prefix = os.path.join(library_path, "index")
+        else:
+            prefix = os.path.splitext(library_path)[0]
+        index_path = f"{prefix}.{self.__embedder.name}.npy"
+        model_path = f"{prefix}.{self.__embedder.name}.model.npy"
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < _library_mtime(library_path):
+            texts = [doc.content_preview for doc in self.__documents]
+            self.__embedder.fit(texts)
+            self.__embedder.save(model_path)
+            np.save(index_path, self.__embedder.encode(texts))
+            logging.info(f"Built local index {index_path}.")
+        else:
+            self.__embedder.load(model_path)
+        return np.load(index_path, mmap_mode="r")
+
+
+def shared_local_backend(library_path: str, model_name: str = None) -> LocalBackend:
+    return shared(("local_backend", library_path, model_name),
+                  lambda: LocalBackend(library_path, create_embedder(model_name)))
+
+
+def _load_library(library_path: str) -> list:
+    return [
+        LocalDocument(row.id, row.name, row.tags, str(row.metadata), row.content)
+        for row in load_library(library_path)
+    ]
+
+
+def _library_mtime(library_path: str) -> float:
+    if not os.path.isdir(library_path):
+        return os.path.getmtime(library_path)
+    return max(
+        os.path.getmtime(os.path.join(directory, name))
+        for directory, _, names in os.walk(library_path)
+        for name in names
+        if not name.startswith("index.")
+    )
+
+
+def _matches_tags(row_tags: set, tags: str) -> bool:
+    # same syntax as the Semantha API: ',' is OR and '+' is AND
+    if not tags:
+        return True
+    return any(all(tag in row_tags for tag in group.split("+") if tag) for group in tags.split(","))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
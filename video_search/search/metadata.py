@@ -0,0 +1,21 @@
+import ast
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+class ReferenceMetadata(NamedTuple):
+    metadata: dict
+    video_id: Optional[str]
+    start: int
+
+
+def parse_video_id(url: str) -> str:
+    # parse id from youtube url
+    parse_result = urlparse(url)
+    query_params = parse_qs(parse_result.query)
+    return query_params.get("v", [None])[0]
+
+
+def parse_reference_metadata(raw_metadata: str) -> ReferenceMetadata:
+    metadata = ast.literal_eval(raw_metadata)
+    return ReferenceMetadata(metadata, parse_video_id(metadata["id"]), metadata.get("start", 0))
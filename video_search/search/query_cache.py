@@ -0,0 +1,130 @@
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from .cache import TTLCache, shared
+
+_TOKEN = re.compile(r"\w+")
+# filler that does not change what a question asks for, negations, question words and prepositions (which give the
+# direction of "convert A to B") are kept on purpose
+_STOPWORDS = frozenset("""
+a an the and or of at is are was were be been am do does did can could would should
+please tell me show explain i you we my your our it this that there here just about some any
+der die das den dem des ein eine einen einem einer und oder ist sind bitte mir mich
+ich du wir es man mal doch eigentlich
+""".split())
+
+
+def query_fingerprint(text: str) -> str:
+    """Canonical form of a query: its content words in order and lower case."""
+    return " ".join(token for token in _TOKEN.findall(text.casefold()) if token not in _STOPWORDS)
+
+
+class _RecentQueries:
+    # ring buffer of the fingerprints and embeddings of the latest queries with the same parameters
+
+    def __init__(self, size: int):
+        self.fingerprints = [None] * size
+        self.vectors = None
+        self.position = 0
+
+    def add(self, fingerprint: str, vector: np.ndarray) -> None:
+        if self.vectors is None:
+            self.vectors = np.zeros((len(self.fingerprints), vector.shape[0]), dtype=np.float32)
+        self.fingerprints[self.position] = fingerprint
+        self.vectors[self.position] = vector
+        self.position = (self.position + 1) % len(self.fingerprints)
+
+    def nearest(self, vector: np.ndarray) -> tuple:
+        if self.vectors is None:
+            return None, 0.0
+        similarities = self.vectors @ vector
+        best = int(np.argmax(similarities))
+        return self.fingerprints[best], float(similarities[best])
+
+
+class NearDuplicateQueryCache:
+    """Second result cache tier for differently phrased versions of the same query.
+
+    Results are keyed by the query parameters and the query fingerprint, so case, punctuation and filler words do not
+    matter. With an ``embedder`` a query that misses is also compared with the recent queries of the
+    same parameters and served from the most similar one if its cosine similarity reaches ``cutoff``.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: int = None, embedder=None, cutoff: float = 0.92,
+                 index_size: int = 256):
+        self.__results = TTLCache(maxsize, ttl, max_bytes)
+        self.__embedder = embedder
+        self.__cutoff = cutoff
+        self.__index_size = index_size
+        self.__recent = {}
+        self.__lock = threading.Lock()
+        self.__counts = Counter()
+
+    def get(self, params: tuple, text: str):
+        fingerprint = query_fingerprint(text)
+        hits = self.__results.get((params, fingerprint)) if fingerprint else None
+        if hits is not None:
+            self.__count("fingerprint_hits")
+            return hits
+        if fingerprint and self.__embedder is not None:
+            vector = self.__embedder.encode([fingerprint])[0]
+            with self.__lock:
+                recent = self.__recent.get(params)
+                match, similarity = (None, 0.0) if recent is None else recent.nearest(vector)
+            if match is not None and similarity >= self.__cutoff:
+                hits = self.__results.get((params, match))
+                if hits is not None:
+                    self.__count("embedding_hits")
+                    return hits
+        self.__count("misses")
+        return None
+
+    def put(self, params: tuple, text: str, hits, size: int = 0) -> None:
+        fingerprint = query_fingerprint(text)
+        if not fingerprint:
+            return
+        self.__results.put((params, fingerprint), hits, size)
+        if self.__embedder is not None:
+            vector = self.__embedder.encode([fingerprint])[0]
+            with self.__lock:
+                if params not in self.__recent:
+                    self.__recent[params] = _RecentQueries(self.__index_size)
+                self.__recent[params].add(fingerprint, vector)
+
+    def invalidate(self, predicate=None) -> int:
+        # predicate gets the query parameters
+        with self.__lock:
+            if predicate is None:
+                self.__recent.clear()
+            else:
+                for params in [params for params in self.__recent if predicate(params)]:
+                    del self.__recent[params]
+        return self.__results.invalidate(None if predicate is None else lambda key: predicate(key[0]))
+
+    def stats(self) -> dict:
+        with self.__lock:
+            counts = dict(self.__counts)
+        lookups = sum(counts.values())
+        hits = counts.get("fingerprint_hits", 0) + counts.get("embedding_hits", 0)
+        return {
+            "size": len(self.__results),
+            "fingerprint_hits": counts.get("fingerprint_hits", 0),
+            "embedding_hits": counts.get("embedding_hits", 0),
+            "misses": counts.get("misses", 0),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "cutoff": self.__cutoff,
+        }
+
+    def __count(self, name: str) -> None:
+        with self.__lock:
+            self.__counts[name] += 1
+
+
+def shared_query_cache(name: str, embedder_factory=None, **kwargs) -> NearDuplicateQueryCache:
+    # the embedder is only created with the cache, loading a model on every Streamlit rerun would be wasted
+    return shared(("query_cache", name), lambda: NearDuplicateQueryCache(
+        embedder=embedder_factory() if embedder_factory is not None else None, **kwargs
+    ))
@@ -0,0 +1,75 @@
+import sys
+
+from .metadata import ReferenceMetadata
+
+_INTERNAL_TAGS = {"TRANSCRIPT_LEVEL", "SENTENCE_LEVEL", "CONTROL"}
+
+
+class SearchHit:
+    """One ranked match of a query. Treat it as read-only, cached hits are shared between sessions."""
+
+    __slots__ = ("document_id", "name", "content", "similarity", "metadata", "tags", "end")
+
+    def __init__(self, document_id: str, name: str, content: str, similarity: int, metadata: ReferenceMetadata,
+                 tags: frozenset, end: int = None):
+        self.document_id = document_id
+        self.name = name
+        self.content = content
+        self.similarity = similarity
+        self.metadata = metadata
+        self.tags = tags
+        # start of the last window if adjacent windows were merged into this hit
+        self.end = metadata.start if end is None else end
+
+    @classmethod
+    def from_document(cls, document, similarity: float, metadata: ReferenceMetadata):
+        return cls(
+            document.id,
+            document.name,
+            document.content_preview.replace("\n", " "),
+            int(round(similarity, 2) * 100),
+            metadata,
+            frozenset(document.tags) - _INTERNAL_TAGS,
+        )
+
+    @classmethod
+    def from_catalog(cls, document, similarity: float, entry):
+        # the document only needs id and content_preview, the rest comes from the catalog entry
+        return cls(
+            document.id,
+            entry.name,
+            document.content_preview.replace("\n", " "),
+            int(round(similarity, 2) * 100),
+            entry.reference_metadata(),
+            entry.tags - _INTERNAL_TAGS,
+        )
+
+    @property
+    def video_url(self) -> str:
+        return self.metadata.metadata["id"]
+
+    @property
+    def start(self) -> int:
+        return self.metadata.start
+
+    def size(self) -> int:
+        # rough footprint for the byte budget of the result cache
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(value) for value in (self.document_id, self.name, self.content, self.metadata.metadata)
+        )
+
+    def __repr__(self):
+        return f"SearchHit({self.document_id!r}, {self.name!r}, similarity={self.similarity})"
+
+
+def hits_to_frame(hits):
+    # pandas is only needed for the debug view, keep it off the request path
+    import pandas as pd
+    frame = pd.DataFrame.from_records(
+        [[hit.name, hit.content, hit.similarity, hit.start, hit.end, hit.metadata.metadata, sorted(hit.tags)]
+         for hit in hits],
+        columns=["Name", "Content", "Similarity", "Start", "End", "Metadata", "Tags"],
+    )
+    frame.index = range(1, frame.shape[0] + 1)
+    frame.index.name = "Rank"
+    return frame
@@ -1,31 +1,77 @@
-import ast
-import io
+import itertools
 import logging
 from abc import abstractmethod
-from itertools import filterfalse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import partial
+from operator import attrgetter
 from time import perf_counter
+from typing import TYPE_CHECKING
 
-import pandas as pd
-import semantha_sdk
-import streamlit as st
-from semantha_sdk.model.document import Document
+import numpy as np
+from requests import Timeout as RequestTimeout
 
+from . import fusion
+from .backends import SemanthaBackend, _to_text_file
+from .cache import SingleFlight, shared, shared_cache
+from .catalog import shared_catalog
+from .client import DeferredClient
+from .diversify import cap_per_video, diversify
+from .local_backend import create_embedder, shared_local_backend
+from .metadata import parse_reference_metadata
+from .query_cache import shared_query_cache
+from .results import SearchHit
+from .tracing import Trace, current_trace, iter_traced, record_span, span, submit
+from .tracking import shared_tracker
 
-def _to_text_file(text: str):
-    input_file = io.BytesIO(text.encode("utf-8"))
-    input_file.name = "input.txt"
-    return input_file
+if TYPE_CHECKING:
+    from semantha_sdk.model.document import Document
+
+
+def _streamlit():
+    # only the Streamlit app falls back to the session, the API service runs without it
+    import streamlit as st
+    return st
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def _retrieval_pool(max_workers: int) -> ThreadPoolExecutor:
+    return shared("retrieval_pool", lambda: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval"))
+
+
+class SearchTimeoutError(Exception):
+    """The dense retrieval did not answer within dense_retrieval_timeout."""
+
+
+# identical queries of concurrent sessions wait for the first one instead of hitting the backend again
+_in_flight_queries = SingleFlight()
+
+_document_id = attrgetter("document_id")
+_similarity = attrgetter("similarity")
 
 
 class RankingStrategy:
+    uses_sparse_references = False
 
-    def __init__(self, semantha):
-        self._semantha = semantha
+    def __init__(self, video_ids: dict):
+        self._video_ids = video_ids
 
     @abstractmethod
-    def rank(self, sentence_references, video_references=None, alpha=0.7) -> list:
+    def rank(self, sentence_references, video_references=None, alpha=0.7, sparse_filter_size=5) -> list:
         raise NotImplementedError("Abstract method")
 
+    def _encode(self, sentence_references, video_references):
+        return fusion.encode_video_ids(
+            list(map(self._video_ids.get, map(_document_id, sentence_references))),
+            list(map(self._video_ids.get, map(_document_id, video_references))),
+        )
+
+    @staticmethod
+    def _select(references, indices) -> list:
+        return list(map(references.__getitem__, indices.tolist()))
+
 
 class DenseOnlyRanking(RankingStrategy):
 
@@ -34,46 +80,107 @@ class DenseOnlyRanking(RankingStrategy):
 
 
 class SparseFilterDenseRanking(RankingStrategy):
+    uses_sparse_references = True
 
     def rank(self, sentence_references, video_references=None, alpha=0.7, sparse_filter_size=5) -> list:
         if video_references is None or sentence_references is None or len(sentence_references) == 0:
             return sentence_references
         else:
-            video_ids = [self._semantha.parse("id", c) for c in video_references]
-            sentence_references[:] = filterfalse(
-                lambda sentence: self._semantha.parse("id", sentence) not in video_ids,
-                sentence_references
-            )
-            return sentence_references
+            dense_codes, sparse_codes, _ = self._encode(sentence_references, video_references)
+            return self._select(sentence_references, fusion.sparse_filter(dense_codes, sparse_codes))
 
 
 class HybridRanking(RankingStrategy):
+    uses_sparse_references = True
 
     def rank(self, sentence_references, video_references=None, alpha=0.7, sparse_filter_size=5) -> list:
-        if video_references is None or sentence_references is None or len(sentence_references):
+        if video_references is None or sentence_references is None or len(sentence_references) == 0:
             return sentence_references
         else:
-            scored = []
-            video_ids = [self._semantha.parse("id", c) for c in video_references]
-            for i, sr in enumerate(sentence_references):
-                self._semantha.parse("id", sr)
-                sentence_id = self._semantha.parse("id", sr)
-                video_rank = video_ids.index(sentence_id) if sentence_id in video_ids else None
-                score = (1/(i + 1)) + (0 if video_rank is None else (alpha * 1/(video_rank + 1)))
-                scored.append((score, sr))
-            scored.sort(key=lambda a: a[0], reverse=True)
-            return [x for _, x in scored]
+            dense_codes, sparse_codes, n_codes = self._encode(sentence_references, video_references)
+            order = fusion.reciprocal_rank_fusion(dense_codes, sparse_codes, n_codes, alpha)
+            return self._select(sentence_references, order)
+
+
+class WeightedSimilarityRanking(RankingStrategy):
+    uses_sparse_references = True
+
+    def rank(self, sentence_references, video_references=None, alpha=0.7, sparse_filter_size=5) -> list:
+        if video_references is None or sentence_references is None or len(sentence_references) == 0:
+            return sentence_references
+        else:
+            dense_codes, sparse_codes, n_codes = self._encode(sentence_references, video_references)
+            order = fusion.weighted_similarity_fusion(
+                dense_codes,
+                np.fromiter(map(_similarity, sentence_references), dtype=np.float64),
+                sparse_codes,
+                np.fromiter(map(_similarity, video_references), dtype=np.float64),
+                n_codes,
+                alpha,
+            )
+            return self._select(sentence_references, order)
 
 
 class Semantha:
-    def __init__(self, demo_config):
-        semantha_secrets = st.secrets["semantha"]
-        self.__sdk = semantha_sdk.login(
-            server_url=semantha_secrets["base_url"],
-            key=semantha_secrets["api_key"],
+    def __init__(self, demo_config, secrets=None):
+        if demo_config.retrieval_backend == "local":
+            # serves searches without the Semantha server, usage tracking is not available then
+            self.__sdk = None
+            self.__domain = f"local:{demo_config.local_library_path}"
+            self.__tracking_domain = None
+            self.__backend = shared_local_backend(demo_config.local_library_path, demo_config.local_embedding_model)
+        else:
+            semantha_secrets = secrets if secrets is not None else _streamlit().secrets["semantha"]
+            # logs in while the first page renders, the first search waits for it if it is not done yet
+            self.__sdk = DeferredClient(
+                server_url=semantha_secrets["base_url"],
+                api_key=semantha_secrets["api_key"],
+                pool_size=demo_config.http_pool_size,
+                # frees the retrieval workers of a hanging request, otherwise the next queries queue up behind it
+                timeout=max(demo_config.dense_retrieval_timeout, demo_config.sparse_retrieval_timeout),
+            )
+            self.__domain = semantha_secrets["domain"]
+            self.__tracking_domain = semantha_secrets.get("tracking_domain")
+            self.__backend = SemanthaBackend(self.__sdk, self.__domain)
+        self.__tracker = None
+        if self.__tracking_domain:
+            self.__tracker = shared_tracker(
+                self.__tracking_domain,
+                self.add_to_library,
+                max_queue=demo_config.tracking_queue_size,
+                batch_size=demo_config.tracking_batch_size,
+                flush_interval=demo_config.tracking_flush_interval,
+                spill_path=demo_config.tracking_spill_path,
+            )
+        self.__metadata_cache = shared_cache(
+            "reference_metadata",
+            maxsize=demo_config.metadata_cache_size,
+            ttl=demo_config.metadata_cache_ttl,
         )
-        self.__domain = semantha_secrets["domain"]
-        self.__tracking_domain = semantha_secrets.get("tracking_domain", default=None)
+        self.__result_cache = shared_cache(
+            "query_results",
+            maxsize=demo_config.result_cache_size,
+            ttl=demo_config.result_cache_ttl,
+            max_bytes=demo_config.result_cache_max_bytes,
+        )
+        self.__query_cache = None
+        if demo_config.near_duplicate_cache:
+            self.__query_cache = shared_query_cache(
+                "near_duplicate_queries",
+                maxsize=demo_config.result_cache_size,
+                ttl=demo_config.result_cache_ttl,
+                max_bytes=demo_config.result_cache_max_bytes,
+                embedder_factory=partial(create_embedder, demo_config.local_embedding_model)
+                if demo_config.near_duplicate_embedding else None,
+                cutoff=demo_config.near_duplicate_cutoff,
+            )
+        self.__retrieval_pool = _retrieval_pool(demo_config.retrieval_workers)
+        self.__dense_timeout = demo_config.dense_retrieval_timeout
+        self.__sparse_timeout = demo_config.sparse_retrieval_timeout
+        self.__sparse_threshold = demo_config.sparse_retrieval_threshold
+        self.__overfetch = demo_config.diversify_overfetch
+        self.__catalog = shared_catalog(demo_config.catalog_path) if demo_config.catalog_path else None
+        self.__last_trace = None
 
     def query_library(self,
                       text: str,
@@ -84,135 +191,355 @@ class Semantha:
                       ranking_strategy: RankingStrategy.__class__ = HybridRanking,
                       sparse_filter_size: int = 5,
                       alpha=0.7,
-                      filter_duplicates=False):
+                      filter_duplicates=False,
+                      control: bool = None,
+                      max_per_video: int = None,
+                      merge_gap: float = None,
+                      diversity: float = None) -> list:
+        return list(self.iter_query_library(
+            text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size, alpha, filter_duplicates, control,
+            max_per_video, merge_gap, diversity
+        ))
+
+    def iter_query_library(self,
+                           text: str,
+                           tags: str,
+                           threshold: float = 0.7,
+                           max_matches: int = 3,
+                           ranking_strategy: RankingStrategy.__class__ = HybridRanking,
+                           sparse_filter_size: int = 5,
+                           alpha=0.7,
+                           filter_duplicates=False,
+                           control: bool = None,
+                           max_per_video: int = None,
+                           merge_gap: float = None,
+                           diversity: float = None):
+        """Yields the SearchHits one by one in ranked order.
+
+        ``control`` defaults to the control group flag of the Streamlit session. ``filter_duplicates`` drops hits with
+        the video url (the "id" of the document metadata) of a better hit, ``max_per_video`` limits the hits per
+        video, ``merge_gap`` merges hits of a video that start at most that many seconds apart and ``diversity``
+        (0 to 1) reorders the hits with MMR. The last three over-fetch candidates and return at most ``max_matches``
+        hits. Combined with ``merge_gap`` or ``diversity``, ``filter_duplicates`` applies after merging, a given
+        ``max_per_video`` replaces it.
+        """
+        if control is None:
+            control = bool(_streamlit().session_state.control)
+        # a search that is part of a larger one (e.g. one domain of MultiDomainSemantha) reports to its trace
+        self.__last_trace = current_trace() or Trace(text)
+        yield from iter_traced(self.__last_trace, self.__iter_cached_hits(
+            text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size, alpha, filter_duplicates,
+            control, max_per_video, merge_gap, diversity
+        ))
+
+    def get_last_trace(self) -> Trace:
+        return self.__last_trace
+
+    def __iter_cached_hits(self, text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size, alpha,
+                           filter_duplicates, control, max_per_video, merge_gap, diversity):
+        key = (
+            self.__domain,
+            _normalize_query(text),
+            tags,
+            control,
+            threshold,
+            max_matches,
+            ranking_strategy.__name__,
+            sparse_filter_size,
+            alpha,
+            filter_duplicates,
+            max_per_video,
+            merge_gap,
+            diversity,
+        )
+        # the near duplicate tier ignores the wording, everything else has to match
+        params = key[:1] + key[2:]
+        with span("result_cache"):
+            hits = self.__result_cache.get(key)
+            if hits is None and self.__query_cache is not None:
+                hits = self.__query_cache.get(params, text)
+        if hits is not None:
+            logging.info(f"Search query: '{text}' served from result cache.")
+            yield from hits
+            return
+        flight, leader = _in_flight_queries.join(key)
+        if not leader:
+            with span("coalesced_wait"):
+                hits = _in_flight_queries.wait(flight, self.__dense_timeout)
+            if hits is not None:
+                logging.info(f"Search query: '{text}' shared the result of an identical query.")
+                yield from hits
+                return
+            # the other query failed or was abandoned, run it here
+        hits = []
+        result = None
+        try:
+            for hit in self.__iter_hits(text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size,
+                                        alpha, filter_duplicates, control, max_per_video, merge_gap, diversity):
+                hits.append(hit)
+                yield hit
+            # only reached if the caller consumed every hit
+            result = tuple(hits)
+            size = sum(hit.size() for hit in hits)
+            self.__result_cache.put(key, result, size=size)
+            if self.__query_cache is not None:
+                self.__query_cache.put(params, text, result, size=size)
+        finally:
+            if leader:
+                _in_flight_queries.finish(key, flight, result)
+
+    def health_check(self) -> bool:
+        return self.__backend.health_check()
+
+    def get_result_cache_stats(self) -> dict:
+        stats = {**self.__result_cache.stats(), **_in_flight_queries.stats()}
+        if self.__query_cache is not None:
+            stats["near_duplicate"] = self.__query_cache.stats()
+        return stats
+
+    def __iter_hits(self, text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size, alpha,
+                    filter_duplicates, control, max_per_video, merge_gap, diversity):
         logging.info(f"Search query: '{text}'")
         search_start = perf_counter()
-        ranking_start = None
-        ranking_end = None
-        if st.session_state.control:
-            sentence_references = self.__get_sentence_refs_control(text, tags, threshold, max_matches)
+        diversified = max_per_video is not None or merge_gap is not None or diversity is not None
+        unique_urls = False
+        if diversified and filter_duplicates:
+            # filtering the candidates would drop the hits that merging and the cap are asked to combine or keep
+            filter_duplicates = False
+            unique_urls = max_per_video is None
+        candidates = max_matches * self.__overfetch if diversified else max_matches
+        if control or not ranking_strategy.uses_sparse_references:
+            # nothing to wait for after the dense leg, the first match can go out right away
+            get_sentence_refs = self.__get_sentence_refs_control if control \
+                else self.__get_sentence_refs_aiedn
+            try:
+                sentence_references, documents = self.__dense_retrieval(
+                    get_sentence_refs, text, tags, threshold, candidates
+                )
+            except RequestTimeout:
+                logging.warning("Dense retrieval timed out.")
+                raise SearchTimeoutError(f"The search timed out after {self.__dense_timeout} seconds.")
         else:
-            sentence_references = self.__get_sentence_refs_aiedn(text, tags, threshold, max_matches)
-
-            video_references = None
-            if ranking_strategy is SparseFilterDenseRanking or ranking_strategy is HybridRanking:
-                video_references = self.__get_video_refs_aiedn(text, tags, sparse_filter_size)
-
-            ranker = ranking_strategy(self)
-            ranking_start = perf_counter()
-            sentence_references = ranker.rank(sentence_references, video_references, alpha, sparse_filter_size)
-            ranking_end = perf_counter()
+            sentence_references, documents = self.__hybrid_retrieval(
+                text, tags, threshold, candidates, ranking_strategy, sparse_filter_size, alpha, search_start
+            )
 
-        result_dict = {}
         if sentence_references is None:
             logging.info(f"No matches found!")
-        else:
-            logging.info(f"Found {len(sentence_references)} matches.")
-            filtered_lib = self.__sdk.domains(self.__domain).reference_documents \
-                .get(offset=0,
-                     limit=len(sentence_references),
-                     filter_document_ids=",".join([str(sr.document_id) for sr in sentence_references]),
-                     return_fields="id,contentpreview,tags,metadata,name")
-            if filtered_lib is not None and len(filtered_lib.documents) > 0:
-                for idx, __ref_doc in enumerate(filtered_lib.documents):
-                    result_dict[__ref_doc.id] = {
-                        "doc_name": __ref_doc.name,
-                        "content": __ref_doc.content_preview,
-                        "similarity": sentence_references[idx].similarity,
-                        "metadata": __ref_doc.metadata,
-                        "tags": set(__ref_doc.tags) - {"TRANSCRIPT_LEVEL", "SENTENCE_LEVEL", "CONTROL"},
-                    }
-        if filter_duplicates:
-            result_dict = self.__filter_duplicates(result_dict)
-        search_end = perf_counter()
-        logging.info(f"Search took {search_end - search_start} seconds.")
-        if ranking_start is not None and ranking_end is not None:
-            logging.info(f"Ranking using {ranking_strategy.__name__} strategy took {ranking_end - ranking_start} seconds.")
-
-        return self.__get_matches(result_dict)
+            return
+        logging.info(f"Found {len(sentence_references)} matches.")
+        hits = self.__iter_candidates(sentence_references, documents, filter_duplicates)
+        if merge_gap is not None or diversity is not None:
+            # merging and MMR need to see all candidates
+            with span("diversify"):
+                hits = diversify(list(hits), max_matches, merge_gap, max_per_video, diversity, unique_urls)
+        elif max_per_video is not None:
+            hits = itertools.islice(cap_per_video(hits, max_per_video), max_matches)
+        for i, hit in enumerate(hits):
+            if i == 0:
+                logging.info(f"First match after {perf_counter() - search_start} seconds.")
+                record_span("first_hit", search_start, perf_counter() - search_start)
+            yield hit
+        logging.info(f"Search took {perf_counter() - search_start} seconds.")
+        record_span("query", search_start, perf_counter() - search_start)
+
+    def __iter_candidates(self, sentence_references, documents, filter_duplicates):
+        seen_documents = set()
+        seen_urls = set()
+        for sr in sentence_references:
+            __ref_doc = documents.get(sr.document_id)
+            if __ref_doc is None or __ref_doc.id in seen_documents:
+                continue
+            seen_documents.add(__ref_doc.id)
+            entry = None if self.__catalog is None else self.__catalog.get(__ref_doc.id)
+            if entry is not None:
+                hit = SearchHit.from_catalog(__ref_doc, sr.similarity, entry)
+            else:
+                metadata = self.__get_cached_metadata(__ref_doc.id, __ref_doc.metadata)
+                hit = SearchHit.from_document(__ref_doc, sr.similarity, metadata)
+            if filter_duplicates:
+                if hit.video_url in seen_urls:
+                    logging.info(f"Found duplicate: {hit.video_url}. Removing...")
+                    continue
+                seen_urls.add(hit.video_url)
+            yield hit
+
+    def __hybrid_retrieval(self, text, tags, threshold, max_matches, ranking_strategy, sparse_filter_size, alpha,
+                           search_start):
+        # dense (fingerprint) and sparse (document) retrieval are independent requests
+        dense = submit(
+            self.__retrieval_pool,
+            self.__dense_retrieval, self.__get_sentence_refs_aiedn, text, tags, threshold, max_matches
+        )
+        sparse = submit(self.__retrieval_pool, self.__sparse_retrieval, text, tags, sparse_filter_size)
+
+        # timeouts count from the start of the query, both legs run in parallel
+        try:
+            with span("wait.dense"):
+                sentence_references, documents = dense.result(
+                    timeout=max(0.0, search_start + self.__dense_timeout - perf_counter())
+                )
+        except (TimeoutError, RequestTimeout):
+            dense.cancel()
+            sparse.cancel()
+            logging.warning(f"Dense retrieval timed out after {self.__dense_timeout} seconds.")
+            # raised instead of returning no matches, an empty result would end up in the result cache
+            raise SearchTimeoutError(f"The search timed out after {self.__dense_timeout} seconds.")
+        try:
+            with span("wait.sparse"):
+                video_references = sparse.result(
+                    timeout=max(0.0, search_start + self.__sparse_timeout - perf_counter())
+                )
+        except TimeoutError:
+            sparse.cancel()
+            logging.warning(f"Sparse retrieval timed out after {self.__sparse_timeout} seconds. "
+                            f"Falling back to {DenseOnlyRanking.__name__}.")
+            return sentence_references, documents
+        except Exception as e:
+            # the dense references alone are a complete result
+            logging.warning(f"Sparse retrieval failed ({e}). Falling back to {DenseOnlyRanking.__name__}.")
+            return sentence_references, documents
+
+        video_ids = {}
+        if video_references is not None:
+            video_ids = self.resolve_video_ids(sentence_references, video_references)
+
+        ranker = ranking_strategy(video_ids)
+        ranking_start = perf_counter()
+        with span(f"ranking.{ranking_strategy.__name__}"):
+            sentence_references = ranker.rank(sentence_references, video_references, alpha, sparse_filter_size)
+        logging.info(f"Ranking using {ranking_strategy.__name__} strategy took {perf_counter() - ranking_start} seconds.")
+        return sentence_references, documents
+
+    def __dense_retrieval(self, get_sentence_refs, text: str, tags: str, threshold: float, max_matches: int):
+        # fetch the library documents right away, ranking only reorders and filters the sentence references
+        with span("dense_retrieval"):
+            sentence_references = get_sentence_refs(text, tags, threshold, max_matches)
+            documents = {}
+            if sentence_references is not None and len(sentence_references) > 0:
+                document_ids = {str(sr.document_id) for sr in sentence_references}
+                # the catalog has everything but the content, only documents missing from it need the rest
+                uncataloged = document_ids if self.__catalog is None \
+                    else {i for i in document_ids if i not in self.__catalog}
+                return_fields = "id,contentpreview,tags,metadata,name" if uncataloged else "id,contentpreview"
+                with span("documents"):
+                    ref_docs = self.__backend.documents(document_ids, return_fields)
+                for __ref_doc in ref_docs:
+                    documents[__ref_doc.id] = __ref_doc
+                    if __ref_doc.id in uncataloged:
+                        self.__cache_metadata(__ref_doc.id, __ref_doc.metadata)
+        return sentence_references, documents
+
+    def __sparse_retrieval(self, text: str, tags: str, sparse_filter_size: int):
+        with span("sparse_retrieval"):
+            video_references = self.__get_video_refs_aiedn(text, tags, sparse_filter_size)
+            # warm the metadata cache so that ranking does not need another round trip
+            self.resolve_metadata(video_references)
+        return video_references
+
+    def __references(self, text: str, tags: str, max_references: int, mode: str, threshold: float = None):
+        with span(f"references.{mode}"):
+            return self.__backend.references(text, tags, max_references, mode, threshold)
 
     def __get_sentence_refs_control(self, text: str, tags: str, threshold: float, max_matches: int):
-        return self.__sdk.domains(self.__domain).references.post(
-                file=_to_text_file(text),
-                similarity_threshold=threshold,
-                max_references=max_matches,
-                with_context=False,
-                tags="+".join(["CONTROL"] + [tags]),
-                mode="document"
-            ).references
+        return self.__references(
+            text,
+            tags="+".join(["CONTROL"] + [tags]),
+            max_references=max_matches,
+            mode="document",
+            threshold=threshold,
+        )
 
     def __get_sentence_refs_aiedn(self, text: str, tags: str, threshold: float, max_matches: int):
-        return self.__sdk.domains(self.__domain).references.post(
-                file=_to_text_file(text),
-                similarity_threshold=threshold,
-                max_references=max_matches,
-                with_context=False,
-                tags="SENTENCE_LEVEL",  # "+".join(["SENTENCE_LEVEL"] + [tags]),
-                mode="fingerprint"
-            ).references
+        return self.__references(
+            text,
+            tags="SENTENCE_LEVEL",  # "+".join(["SENTENCE_LEVEL"] + [tags]),
+            max_references=max_matches,
+            mode="fingerprint",
+            threshold=threshold,
+        )
 
     def __get_video_refs_aiedn(self, text: str, tags: str, sparse_filter_size: int):
-        return self.__sdk.domains(self.__domain).references.post(
-                    file=_to_text_file(text),
-                    max_references=sparse_filter_size,
-                    with_context=False,
-                    tags="TRANSCRIPT_LEVEL",  # "+".join(["TRANSCRIPT_LEVEL"] + [tags]),
-                    mode="document"
-                ).references
+        return self.__references(
+            text,
+            tags="TRANSCRIPT_LEVEL",  # "+".join(["TRANSCRIPT_LEVEL"] + [tags]),
+            max_references=sparse_filter_size,
+            mode="document",
+            threshold=self.__sparse_threshold,
+        )
+
+    def track_usage(self, content: str, tag: str) -> None:
+        # returns immediately, the tracker's worker thread calls add_to_library
+        if self.__tracker is not None:
+            self.__tracker.track(content, tag)
+
+    def get_tracking_stats(self) -> dict:
+        return {} if self.__tracker is None else self.__tracker.stats()
 
     def add_to_library(self, content: str, tag: str) -> None:
         if not self.__tracking_domain:
             return
         self.__sdk.domains(self.__tracking_domain).reference_documents.post(file=_to_text_file(content), tags=tag)
 
-    @staticmethod
-    def __get_matches(results):
-        matches = pd.DataFrame.from_records(
-            [
-                [
-                    r["doc_name"],
-                    r["content"].replace("\n", " "),
-                    int(round(r["similarity"], 2) * 100),
-                    r["metadata"],
-                    r["tags"],
-                ]
-                for r in list(results.values())
-            ],
-            columns=["Name", "Content", "Similarity", "Metadata", "Tags"],
-        )
-        matches.index = range(1, matches.shape[0] + 1)
-        matches.index.name = "Rank"
-        return matches
-
-    def __get_document_content(self, doc: Document) -> str:
+    def __get_document_content(self, doc: "Document") -> str:
         content = ""
         for p in doc.pages:
             for c in p.contents:
                 content += "\n".join([par.text for par in c.paragraphs])
         return content
 
-    def __get_ref_doc(self, doc_id: str, domain: str) -> Document:
-        return self.__sdk.domains(domain).reference_documents(doc_id).get()
-
-    def parse(self, key, document):
-        from urllib.parse import urlparse, parse_qs
-        document = self.__get_ref_doc(document.document_id, self.__domain)
-        value = ast.literal_eval(document.metadata)[key]
-        if key == "id":
-            # parse id from youtube url
-            parse_result = urlparse(value)
-            query_params = parse_qs(parse_result.query)
-            return query_params["v"][0]
-
-    def __filter_duplicates(self, result_dict):
-        __seen_video_ids = []
-        __filtered_sentence_references = {}
-        for e in result_dict:
-            entry = ast.literal_eval(result_dict[e]["metadata"])
-            if entry["id"] not in __seen_video_ids:
-                __seen_video_ids.append(entry["id"])
-                __filtered_sentence_references[e] = result_dict[e]
+    def resolve_video_ids(self, *references) -> dict:
+        return {
+            document_id: metadata.video_id
+            for document_id, metadata in self.resolve_metadata(*references).items()
+        }
+
+    def resolve_metadata(self, *references) -> dict:
+        document_ids = {r.document_id for refs in references if refs is not None for r in refs}
+        resolved = {}
+        missing = []
+        for document_id in document_ids:
+            metadata = self.__get_catalog_metadata(document_id)
+            if metadata is None:
+                metadata = self.__metadata_cache.get((self.__domain, document_id))
+            if metadata is None:
+                missing.append(document_id)
             else:
-                logging.info(f"Found duplicate: {entry['id']}. Removing...")
-        logging.info(f"After duplicate filtering {len(__filtered_sentence_references)} matches remain.")
-        return __filtered_sentence_references
+                resolved[document_id] = metadata
+        if len(missing) > 0:
+            with span("resolve_metadata"):
+                for doc in self.__backend.documents(missing, "id,metadata"):
+                    resolved[doc.id] = self.__cache_metadata(doc.id, doc.metadata)
+        return resolved
+
+    def invalidate_result_cache(self) -> int:
+        if self.__query_cache is not None:
+            self.__query_cache.invalidate(lambda params: params[0] == self.__domain)
+        return self.__result_cache.invalidate(lambda key: key[0] == self.__domain)
+
+    def invalidate_metadata_cache(self, document_ids=None) -> int:
+        # to be called after the library of the domain has been re-uploaded
+        if document_ids is None:
+            return self.__metadata_cache.invalidate(lambda key: key[0] == self.__domain)
+        document_ids = set(document_ids)
+        return self.__metadata_cache.invalidate(lambda key: key[0] == self.__domain and key[1] in document_ids)
+
+    def get_metadata_cache_stats(self) -> dict:
+        return self.__metadata_cache.stats()
+
+    def __get_catalog_metadata(self, document_id: str):
+        if self.__catalog is None:
+            return None
+        entry = self.__catalog.get(document_id)
+        return None if entry is None else entry.reference_metadata()
+
+    def __get_cached_metadata(self, document_id: str, raw_metadata: str):
+        metadata = self.__metadata_cache.get((self.__domain, document_id))
+        if metadata is None:
+            metadata = self.__cache_metadata(document_id, raw_metadata)
+        return metadata
+
+    def __cache_metadata(self, document_id: str, raw_metadata: str):
+        metadata = parse_reference_metadata(raw_metadata)
+        self.__metadata_cache.put((self.__domain, document_id), metadata)
+        return metadata
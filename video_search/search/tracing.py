@@ -0,0 +1,156 @@
+import contextvars
+import json
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+
+_QUANTILES = (0.5, 0.95, 0.99)
+_HISTOGRAM_WINDOW = 4096
+
+
+class Trace:
+    """Spans and HTTP request count of a single query.
+
+    The trace is carried in a context variable, so everything that runs in the query's context (including the
+    retrieval pool threads, see ``submit``) adds its spans to it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = perf_counter()
+        self.spans = []
+        self.http_requests = 0
+        self.__lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, duration: float) -> None:
+        with self.__lock:
+            self.spans.append((name, start - self.start, duration, threading.current_thread().name))
+
+    def count_http_request(self) -> None:
+        with self.__lock:
+            self.http_requests += 1
+
+    def breakdown(self) -> list:
+        with self.__lock:
+            return [
+                {"span": name, "offset_ms": offset * 1000, "duration_ms": duration * 1000, "thread": thread}
+                for name, offset, duration, thread in sorted(self.spans, key=lambda s: s[1])
+            ]
+
+
+class _Histogram:
+
+    def __init__(self):
+        self.samples = deque(maxlen=_HISTOGRAM_WINDOW)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self) -> dict:
+        if len(self.samples) == 0:
+            return {q: 0.0 for q in _QUANTILES}
+        return dict(zip(_QUANTILES, np.quantile(np.fromiter(self.samples, dtype=float), _QUANTILES).tolist()))
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_histograms = {}
+_http_requests = 0
+_lock = threading.Lock()
+
+
+def current_trace() -> Trace:
+    return _current_trace.get()
+
+
+def record_span(name: str, start: float, duration: float) -> None:
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = _Histogram()
+        _histograms[name].add(duration)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, duration)
+
+
+@contextmanager
+def span(name: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, start, perf_counter() - start)
+
+
+def count_http_request() -> None:
+    global _http_requests
+    with _lock:
+        _http_requests += 1
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count_http_request()
+
+
+def submit(pool, fn, *args):
+    # executor threads do not inherit the caller's context variables
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def run_traced(trace: Trace, fn, *args):
+    """Calls ``fn`` with ``trace`` as the current trace, e.g. on a pool thread."""
+    context = contextvars.copy_context()
+    context.run(_current_trace.set, trace)
+    return context.run(fn, *args)
+
+
+def iter_traced(trace: Trace, generator):
+    """Advances ``generator`` with ``trace`` as the current trace, without leaking it into the consumer."""
+    context = contextvars.copy_context()
+    context.run(_current_trace.set, trace)
+    while True:
+        try:
+            item = context.run(next, generator)
+        except StopIteration:
+            return
+        yield item
+
+
+def metrics() -> dict:
+    with _lock:
+        spans = {
+            name: {"count": h.count, "sum": h.sum, **{f"p{int(q * 100)}": v for q, v in h.quantiles().items()}}
+            for name, h in sorted(_histograms.items())
+        }
+        return {"http_requests": _http_requests, "spans": spans}
+
+
+def export_json() -> str:
+    return json.dumps(metrics(), indent=2)
+
+
+def export_prometheus() -> str:
+    lines = [
+        "# TYPE video_search_http_requests_total counter",
+        "# TYPE video_search_span_seconds summary",
+    ]
+    with _lock:
+        lines.insert(1, f"video_search_http_requests_total {_http_requests}")
+        for name, h in sorted(_histograms.items()):
+            for q, v in h.quantiles().items():
+                lines.append(f'video_search_span_seconds{{span="{name}",quantile="{q}"}} {v}')
+            lines.append(f'video_search_span_seconds_sum{{span="{name}"}} {h.sum}')
+            lines.append(f'video_search_span_seconds_count{{span="{name}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    global _http_requests
+    with _lock:
+        _histograms.clear()
+        _http_requests = 0
@@ -0,0 +1,112 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+from time import monotonic
+
+from .cache import shared
+
+
+class UsageTracker:
+    """Writes usage tracking events from a background thread, so searches never wait for the tracking domain.
+
+    Events are queued (bounded, events beyond ``max_queue`` are dropped and counted) and written in batches of
+    ``batch_size`` or every ``flush_interval`` seconds. Batches that cannot be written are appended to a local spill
+    file and written again after the next successful flush, also the ones an earlier process spilled (counted as
+    replayed).
+    """
+
+    def __init__(self, write_event, max_queue: int = 1000, batch_size: int = 20, flush_interval: float = 5.0,
+                 spill_path: str = None):
+        self.__write_event = write_event
+        self.__queue = queue.Queue(maxsize=max_queue)
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__spill_path = spill_path
+        self.__spill_lock = threading.Lock()
+        # request threads count drops, the worker counts everything else
+        self.__counts = Counter()
+        self.__counts_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__worker = threading.Thread(target=self.__run, name="usage-tracking", daemon=True)
+        self.__worker.start()
+        atexit.register(self.close)
+
+    def track(self, content: str, tag: str) -> bool:
+        try:
+            self.__queue.put_nowait((content, tag))
+            return True
+        except queue.Full:
+            self.__count("dropped")
+            return False
+
+    def stats(self) -> dict:
+        with self.__counts_lock:
+            counts = dict(self.__counts)
+        return {
+            "queued": self.__queue.qsize(),
+            **{name: counts.get(name, 0) for name in ("written", "dropped", "spilled", "replayed")},
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        self.__stopped.set()
+        self.__worker.join(timeout)
+
+    def __run(self):
+        batch = []
+        deadline = monotonic() + self.__flush_interval
+        while not (self.__stopped.is_set() and self.__queue.empty()):
+            try:
+                batch.append(self.__queue.get(timeout=max(0.0, min(1.0, deadline - monotonic()))))
+            except queue.Empty:
+                pass
+            if len(batch) >= self.__batch_size or monotonic() >= deadline or self.__stopped.is_set():
+                if len(batch) > 0:
+                    self.__flush(batch)
+                    batch = []
+                deadline = monotonic() + self.__flush_interval
+
+    def __flush(self, batch):
+        try:
+            for i, event in enumerate(batch):
+                self.__write_event(*event)
+                self.__count("written")
+        except Exception as e:
+            logging.warning(f"Usage tracking is unavailable ({e}), spilling {len(batch) - i} events.")
+            self.__spill(batch[i:])
+            return
+        self.__replay_spill()
+
+    def __spill(self, events):
+        if self.__spill_path is None:
+            self.__count("dropped", len(events))
+            return
+        with self.__spill_lock, open(self.__spill_path, "a", encoding="utf-8") as f:
+            for content, tag in events:
+                f.write(json.dumps({"content": content, "tag": tag}, ensure_ascii=False))
+                f.write("\n")
+        self.__count("spilled", len(events))
+
+    def __replay_spill(self):
+        if self.__spill_path is None or not os.path.exists(self.__spill_path):
+            return
+        with self.__spill_lock:
+            with open(self.__spill_path, encoding="utf-8") as f:
+                events = [(e["content"], e["tag"]) for e in map(json.loads, f)]
+            os.remove(self.__spill_path)
+        # the spill file can be older than this process, so this is not subtracted from the spilled events
+        self.__count("replayed", len(events))
+        logging.info(f"Writing {len(events)} spilled usage tracking events.")
+        self.__flush(events)
+
+    def __count(self, name: str, n: int = 1) -> None:
+        with self.__counts_lock:
+            self.__counts[name] += n
+
+
+def shared_tracker(name: str, write_event, **kwargs) -> UsageTracker:
+    # one queue and worker thread per tracking domain
+    return shared(("tracker", name), lambda: UsageTracker(write_event, **kwargs))
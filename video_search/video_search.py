@@ -3,12 +3,12 @@ from .pages.search_page import SearchPage
 from .pages.sidebar import Sidebar
 import streamlit as st
 
-from video_search.search.semantha import Semantha
+from video_search.search.fanout import create_search
 
 
 class VideoSearch:
     def __init__(self, demo_config):
-        self.__semantha = Semantha(demo_config)
+        self.__semantha = create_search(demo_config)
         self.__page_manager = PageManager(demo_config)
         self.__sidebar = Sidebar(self.__page_manager, demo_config)
         self.__search_page = SearchPage(self.__sidebar, self.__semantha, demo_config)
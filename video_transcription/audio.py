@@ -0,0 +1,140 @@
+"""Speech-only, batched transcription.
+
+The audio of every mp3 is decoded once to 16 kHz PCM and cached as .npy, which is memory-mapped on later runs. A CPU
+voice activity detector finds the speech regions, which are packed into chunks of at most 30 seconds (the window
+whisper works on) and decoded in batches. Segment timestamps are shifted by the chunk offsets, so they still refer
+to the time in the video.
+"""
+import os
+
+import numpy as np
+import torch
+import whisper
+
+SAMPLE_RATE = 16000
+_CHUNK_SECONDS = 30
+_FRAME_SECONDS = 0.03
+_TIME_PRECISION = 0.02  # seconds per whisper timestamp token
+
+
+def decode_audio(mp3, cache_directory, key):
+    """16 kHz mono int16 samples of the mp3, decoded by ffmpeg on the first call and memory-mapped afterwards."""
+    path = os.path.join(cache_directory, f"{key}.pcm16k.npy")
+    if not os.path.exists(path):
+        os.makedirs(cache_directory, exist_ok=True)
+        samples = whisper.audio.load_audio(mp3, sr=SAMPLE_RATE)
+        # whisper.audio.load_audio scales int16 to [-1, 1), half the size on disk without losing anything
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, np.round(samples * 32768).clip(-32768, 32767).astype(np.int16))
+        os.replace(f"{path}.tmp", path)
+    return np.load(path, mmap_mode="r")
+
+
+def _speech_frames(audio, frame, margin_db=12.0, floor_db=-55.0):
+    try:
+        import webrtcvad
+    except ImportError:
+        webrtcvad = None
+    n_frames = len(audio) // frame
+    frames = np.asarray(audio[:n_frames * frame]).reshape(n_frames, frame)
+    if webrtcvad is not None:
+        vad = webrtcvad.Vad(2)
+        return np.array([vad.is_speech(f.tobytes(), SAMPLE_RATE) for f in frames], dtype=bool)
+    # energy detector: louder than the noise floor of the recording by margin_db
+    energy_db = 10 * np.log10(np.mean((frames.astype(np.float32) / 32768) ** 2, axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 10)
+    return energy_db > max(noise_floor + margin_db, floor_db)
+
+
+def _runs(mask):
+    # (start, end) frame indices of the True runs
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def detect_speech(audio, min_speech=0.25, min_silence=0.6, padding=0.2):
+    """(start, end) sample offsets of the speech in ``audio``.
+
+    Uses webrtcvad if it is installed and an energy detector otherwise. Pauses shorter than ``min_silence`` seconds
+    are kept, speech shorter than ``min_speech`` seconds is dropped and every region is padded by ``padding``.
+    """
+    frame = int(SAMPLE_RATE * _FRAME_SECONDS)
+    mask = _speech_frames(audio, frame)
+    for start, end in _runs(~mask):
+        if start > 0 and end < len(mask) and (end - start) * _FRAME_SECONDS < min_silence:
+            mask[start:end] = True
+    regions = []
+    pad = int(padding * SAMPLE_RATE)
+    for start, end in _runs(mask):
+        if (end - start) * _FRAME_SECONDS >= min_speech:
+            regions.append((max(0, start * frame - pad), min(len(audio), end * frame + pad)))
+    return regions
+
+
+def pack_chunks(regions, max_seconds=_CHUNK_SECONDS):
+    """Merges consecutive speech regions into chunks of at most ``max_seconds``, splitting longer regions."""
+    max_samples = max_seconds * SAMPLE_RATE
+    chunks = []
+    for start, end in regions:
+        if chunks and end - chunks[-1][0] <= max_samples:
+            chunks[-1] = (chunks[-1][0], end)
+            continue
+        while end - start > max_samples:
+            chunks.append((start, start + max_samples))
+            start += max_samples
+        chunks.append((start, end))
+    return chunks
+
+
+def _timestamped_segments(tokens, timestamp_begin, eot):
+    """(start, end, text tokens) in seconds relative to the chunk, end is None if the chunk ends mid segment."""
+    segments = []
+    start = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token >= eot and token < timestamp_begin:
+            continue
+        if token >= timestamp_begin:
+            time = (token - timestamp_begin) * _TIME_PRECISION
+            if text_tokens:
+                segments.append((start, time, text_tokens))
+                text_tokens = []
+            start = time
+        else:
+            text_tokens.append(token)
+    if text_tokens:
+        segments.append((start, None, text_tokens))
+    return segments
+
+
+def transcribe_speech(model, audio, regions, batch_size=8):
+    """Transcribes the speech regions of ``audio`` like model.transcribe, with timestamps in video time."""
+    kwargs = {"num_languages": model.num_languages} if hasattr(model, "num_languages") else {}
+    tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, task="transcribe", **kwargs)
+    n_mels = getattr(model.dims, "n_mels", 80)
+    options = whisper.DecodingOptions(task="transcribe", without_timestamps=False, fp16=model.device.type == "cuda")
+    chunks = pack_chunks(regions)
+    segments = []
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(torch.from_numpy(np.asarray(audio[start:end], dtype=np.float32) / 32768)),
+                n_mels,
+            )
+            for start, end in batch
+        ]).to(model.device)
+        for (start, end), result in zip(batch, whisper.decode(model, mel, options)):
+            offset = start / SAMPLE_RATE
+            chunk_end = end / SAMPLE_RATE
+            for segment_start, segment_end, text_tokens in _timestamped_segments(
+                result.tokens, tokenizer.timestamp_begin, tokenizer.eot
+            ):
+                text = tokenizer.decode(text_tokens)
+                if text.strip():
+                    segments.append({
+                        "start": round(min(offset + segment_start, chunk_end), 2),
+                        "end": round(chunk_end if segment_end is None else min(offset + segment_end, chunk_end), 2),
+                        "text": text,
+                    })
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
@@ -0,0 +1,76 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class TranscriptionBackend(ABC):
+    """Turns audio (an mp3 path or 16 kHz float32 samples) into {"text": ..., "segments": [{start, end, text}]}."""
+
+    name = None
+
+    @abstractmethod
+    def transcribe(self, audio, cache_key=None) -> dict:
+        raise NotImplementedError("Abstract method")
+
+
+class WhisperBackend(TranscriptionBackend):
+    """The reference openai-whisper model, with the optional speech-only preprocessing of audio.py."""
+
+    name = "whisper"
+
+    def __init__(self, model_size, device, threads, vad=None):
+        import torch
+        import whisper
+        torch.set_num_threads(threads)
+        self.__model = whisper.load_model(model_size, device=device)
+        self.__vad = vad
+
+    def transcribe(self, audio, cache_key=None) -> dict:
+        if self.__vad is None:
+            return self.__model.transcribe(audio=audio)
+        from video_transcription.audio import decode_audio, detect_speech, transcribe_speech
+        if isinstance(audio, str) and cache_key is not None:
+            samples = decode_audio(audio, self.__vad["audio_cache"], cache_key)
+        else:
+            if isinstance(audio, str):
+                import whisper
+                audio = whisper.audio.load_audio(audio)
+            samples = np.round(audio * 32768).clip(-32768, 32767).astype(np.int16)
+        return transcribe_speech(self.__model, samples, detect_speech(samples), self.__vad["batch_size"])
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 port of whisper, int8 quantized on the CPU. Requires the optional faster-whisper package.
+
+    With VAD it uses faster-whisper's own Silero detector instead of audio.py.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size, device, threads, vad=None, compute_type=None):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The faster-whisper backend needs the faster-whisper package: "
+                              "pip install faster-whisper") from e
+        self.__model = WhisperModel(
+            model_size,
+            device=device,
+            compute_type=compute_type or ("int8" if device == "cpu" else "float16"),
+            cpu_threads=threads,
+        )
+        self.__vad = vad is not None
+
+    def transcribe(self, audio, cache_key=None) -> dict:
+        segments, _ = self.__model.transcribe(audio, vad_filter=self.__vad)
+        segments = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+        return {"text": "".join(s["text"] for s in segments), "segments": segments}
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+
+def create_backend(name, model_size, device, threads, vad=None) -> TranscriptionBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend '{name}', choose one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_size, device, threads, vad)
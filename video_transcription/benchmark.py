@@ -0,0 +1,140 @@
+"""Compares transcription backends on a sample clip.
+
+    python -m video_transcription.benchmark --clip sample.mp3 --seconds 120 --model-size base \\
+        --backends whisper,faster-whisper --vad
+
+Every backend runs in its own process, which reports the real-time factor (transcription time / audio duration,
+below 1 is faster than real time) and the peak memory of the process. Words are compared against the first backend
+with the word error rate and the first differing passages.
+"""
+import argparse
+import difflib
+import multiprocessing
+import os
+import queue as queues
+import re
+from time import perf_counter
+
+from video_transcription.backends import BACKENDS, create_backend
+
+_SAMPLE_RATE = 16000
+_WORD = re.compile(r"\w+(?:'\w+)?")
+
+
+def _peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(name, model_size, device, threads, vad, audio, results):
+    try:
+        load_start = perf_counter()
+        backend = create_backend(name, model_size, device, threads, vad)
+        load_time = perf_counter() - load_start
+        start = perf_counter()
+        transcript = backend.transcribe(audio)
+    except Exception as e:
+        # e.g. the optional package of the backend is not installed
+        results.put({"backend": name, "error": f"{type(e).__name__}: {e}"})
+        return
+    results.put({
+        "backend": name,
+        "load": load_time,
+        "elapsed": perf_counter() - start,
+        "peak_mb": _peak_memory_mb(),
+        "text": transcript["text"],
+    })
+
+
+def _wait_for_result(name, process, results):
+    # a crashed process (killed for memory, segfault in native code) never reports anything
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except queues.Empty:
+            if not process.is_alive():
+                try:
+                    return results.get(timeout=1.0)
+                except queues.Empty:
+                    return {"backend": name, "error": f"process exited with code {process.exitcode}"}
+
+
+def words(text):
+    return _WORD.findall(text.casefold())
+
+
+def word_error_rate(reference, hypothesis):
+    # word level edit distance divided by the reference length
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, start=1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(reference))
+
+
+def word_diff(reference, hypothesis, limit=5):
+    matcher = difflib.SequenceMatcher(a=reference, b=hypothesis, autojunk=False)
+    changes = [
+        f"  {tag}: '{' '.join(reference[i1:i2])}' -> '{' '.join(hypothesis[j1:j2])}'"
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+    ]
+    return changes[:limit]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare transcription backends on a sample clip.")
+    parser.add_argument('--clip', type=str, required=True, help='audio or video file ffmpeg can read')
+    parser.add_argument('--seconds', type=float, default=None, help='only use the start of the clip')
+    parser.add_argument('--model-size', type=str, default='base')
+    parser.add_argument('--backends', type=str, default=','.join(BACKENDS),
+                        help='comma separated, the first one is the reference for the word diff')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--vad', action='store_true', help='transcribe only the detected speech')
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    import whisper
+    audio = whisper.audio.load_audio(args.clip, sr=_SAMPLE_RATE)
+    if args.seconds is not None:
+        audio = audio[:int(args.seconds * _SAMPLE_RATE)]
+    duration = len(audio) / _SAMPLE_RATE
+    # without a cache key the audio is not cached, the vad options only need the batch size
+    vad = {"audio_cache": None, "batch_size": args.batch_size} if args.vad else None
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    failed = []
+    for name in args.backends.split(","):
+        queue = context.Queue()
+        process = context.Process(
+            target=_run, args=(name, args.model_size, args.device, args.threads, vad, audio, queue)
+        )
+        process.start()
+        result = _wait_for_result(name, process, queue)
+        process.join()
+        (failed if "error" in result else results).append(result)
+
+    for result in failed:
+        print(f"{result['backend']} failed: {result['error']}")
+    if not results:
+        raise SystemExit("No backend could transcribe the clip.")
+    print(f"{duration:.1f} seconds of audio, model {args.model_size}, {args.threads} threads")
+    print(f"{'backend':<16} {'load s':>7} {'RTF':>7} {'peak MB':>8} {'WER':>7}")
+    reference = words(results[0]["text"])
+    for result in results:
+        hypothesis = words(result["text"])
+        peak = "n/a" if result["peak_mb"] is None else f"{result['peak_mb']:.0f}"
+        print(f"{result['backend']:<16} {result['load']:>7.1f} {result['elapsed'] / duration:>7.3f} {peak:>8} "
+              f"{word_error_rate(reference, hypothesis):>7.1%}")
+    for result in results[1:]:
+        changes = word_diff(reference, words(result["text"]))
+        if changes:
+            print(f"\nFirst differences of {result['backend']} to {results[0]['backend']}:")
+            print("\n".join(changes))
@@ -0,0 +1,152 @@
+import glob
+import json
+import os
+from itertools import accumulate
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Only the standard library (and optionally pyarrow) is used here, the search app reads libraries through this module.
+
+VIDEOS_FILE = "videos.jsonl"
+ROWS_DIRECTORY = "rows"
+
+
+def video_id(video):
+    query_params = parse_qs(urlparse(video["url"]).query)
+    return query_params["v"][0] if "v" in query_params else video["hash"][:16]
+
+
+def build_windows(segments, window_size, stride=1):
+    """Yield (first segment, last segment, text) for every window of window_size + 1 consecutive segments.
+
+    The segment texts are joined once, every window is a slice between two prefix offsets.
+    """
+    if len(segments) == 0:
+        return
+    texts = [s["text"] for s in segments]
+    offsets = list(accumulate((len(text) + 1 for text in texts), initial=0))
+    joined = " ".join(texts)
+    for start in range(0, len(segments), stride):
+        end = min(len(segments) - 1, start + window_size)
+        yield start, end, joined[offsets[start]:offsets[end] + len(texts[end])]
+
+
+def build_rows(video, transcript, window_size, stride=1):
+    vid = video_id(video)
+    # One entry for the whole transcript
+    rows = [{
+        "row_id": f"{vid}:transcript",
+        "video_id": vid,
+        "kind": "TRANSCRIPT",
+        "start": 0.0,
+        "end": transcript["segments"][-1]["end"] if transcript["segments"] else 0.0,
+        "content": transcript["text"],
+    }]
+    # Followed by an entry for every window of consecutive segments
+    for start, end, text in build_windows(transcript["segments"], window_size, stride):
+        rows.append({
+            "row_id": f"{vid}:{start}-{end}",
+            "video_id": vid,
+            "kind": "SEGMENT",
+            "start": transcript["segments"][start]["start"],
+            "end": transcript["segments"][end]["end"],
+            "content": text,
+        })
+    return rows
+
+
+class LibraryWriter:
+    """Writes the library as a videos table plus one row shard per video.
+
+    Video level fields (title, url, description, tags) are stored once in videos.jsonl, the rows reference them by
+    video_id. Shards are parquet files if pyarrow is installed and jsonl files otherwise.
+    """
+
+    def __init__(self, directory, row_format=None):
+        self.directory = directory
+        self.row_format = row_format or ("parquet" if pq is not None else "jsonl")
+        if self.row_format == "parquet" and pq is None:
+            raise ImportError("Writing parquet shards requires pyarrow.")
+        os.makedirs(os.path.join(directory, ROWS_DIRECTORY), exist_ok=True)
+
+    def write_videos(self, playlist):
+        _write_jsonl(os.path.join(self.directory, VIDEOS_FILE), [{
+            "video_id": video_id(video),
+            "title": video["title"],
+            "url": video["url"],
+            "description": video["description"],
+            "tags": video["tags"],
+            "playlist": video["playlist"],
+        } for video in playlist])
+
+    def write_rows(self, video, rows):
+        path = os.path.join(self.directory, ROWS_DIRECTORY, f"{video_id(video)}.{self.row_format}")
+        if self.row_format == "parquet":
+            pq.write_table(pa.Table.from_pylist(rows), f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        else:
+            _write_jsonl(path, rows)
+
+    def remove_stale_rows(self, playlist):
+        current = {video_id(video) for video in playlist}
+        for path in _row_shards(self.directory):
+            if os.path.splitext(os.path.basename(path))[0] not in current:
+                os.remove(path)
+
+
+def read_videos(directory):
+    with open(os.path.join(directory, VIDEOS_FILE), encoding="utf-8") as f:
+        return {video["video_id"]: video for video in map(json.loads, f)}
+
+
+def read_rows(directory, vid):
+    for row_format in ("parquet", "jsonl"):
+        path = os.path.join(directory, ROWS_DIRECTORY, f"{vid}.{row_format}")
+        if not os.path.exists(path):
+            continue
+        if row_format == "parquet":
+            if pq is None:
+                raise ImportError(f"Reading {path} requires pyarrow.")
+            return pq.read_table(path).to_pylist()
+        with open(path, encoding="utf-8") as f:
+            return list(map(json.loads, f))
+    return []
+
+
+def read_library(directory):
+    """Yield the library rows in playlist order and in the layout of the original spreadsheet, plus their row_id."""
+    for vid, video in read_videos(directory).items():
+        for row in read_rows(directory, vid):
+            url = video["url"] if row["kind"] == "TRANSCRIPT" else f"{video['url']}&t={int(row['start'])}s"
+            yield {
+                "row_id": row["row_id"],
+                "Name": video["title"],
+                "Content": row["content"],
+                "Metadata": {
+                    "url": url,
+                    "description": video["description"],
+                    "tags": video["tags"]
+                },
+                "Tags": f"{row['kind']}, {video['playlist']}"
+            }
+
+
+def _row_shards(directory):
+    return sorted(
+        glob.glob(os.path.join(directory, ROWS_DIRECTORY, "*.parquet"))
+        + glob.glob(os.path.join(directory, ROWS_DIRECTORY, "*.jsonl"))
+    )
+
+
+def _write_jsonl(path, records):
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+    os.replace(f"{path}.tmp", path)
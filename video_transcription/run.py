@@ -1,16 +1,20 @@
 import argparse
+import hashlib
 import json
+import multiprocessing
 import os
 
-import pandas as pd
 import torch
 import tqdm
-import whisper
+
+from video_transcription.backends import BACKENDS, create_backend
+from video_transcription.library import LibraryWriter, build_rows, read_library
 
 
 class Playlist:
     def __init__(self, playlist_path):
-        playlist_directory = sorted(os.listdir(playlist_path))
+        # skip everything this script writes into the directory itself
+        playlist_directory = sorted(f for f in os.listdir(playlist_path) if f.endswith((".json", ".mp3")))
         playlist_info = json.load(open(os.path.join(playlist_path, playlist_directory[0]), encoding="utf-8"))
 
         self.title = playlist_info["title"]
@@ -37,51 +41,159 @@ class Playlist:
         return len(self.videos)
 
 
+def content_hash(path, chunk_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class Checkpoints:
+    """One json file per transcribed video, keyed by the mp3 content, the model size and the variant.
+
+    The variant tells backends and preprocessing apart, it is empty for the reference whisper model.
+    """
+
+    def __init__(self, directory, model_size, variant=""):
+        self.directory = directory
+        self.model_size = model_size
+        self.suffix = variant
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, video):
+        return os.path.join(self.directory, f"{video['hash']}_{self.model_size}{self.suffix}.json")
+
+    def exists(self, video):
+        return os.path.exists(self.path(video))
+
+    def load(self, video):
+        with open(self.path(video), encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, video, transcript):
+        # write to a temporary file first, a crash must not leave a truncated checkpoint behind
+        path = self.path(video)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "text": transcript["text"],
+                "segments": [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in transcript["segments"]]
+            }, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+
+_backend = None
+_checkpoints = None
+
+
+def _init_worker(backend, model_size, device, checkpoints, threads, vad=None):
+    # every worker loads the model once and then transcribes videos from the pool's queue
+    global _backend, _checkpoints
+    _backend = create_backend(backend, model_size, device, threads, vad)
+    _checkpoints = checkpoints
+
+
+def _transcribe(video):
+    _checkpoints.save(video, _backend.transcribe(video["mp3"], cache_key=video["hash"]))
+    return video
+
+
+def transcribe_playlist(playlist, checkpoints, model_size, device, workers, vad=None, backend="whisper",
+                        threads=None):
+    """Yields every video of the playlist as soon as its checkpoint is available."""
+    pending = []
+    for video in playlist:
+        if checkpoints.exists(video):
+            yield video
+        else:
+            pending.append(video)
+    print(f"{len(playlist) - len(pending)} of {len(playlist)} videos are already transcribed.")
+    if len(pending) == 0:
+        return
+    workers = max(1, min(workers, len(pending)))
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    initargs = (backend, model_size, device, checkpoints, threads, vad)
+    if workers == 1:
+        _init_worker(*initargs)
+        for video in tqdm.tqdm(pending, total=len(pending)):
+            yield _transcribe(video)
+        return
+    # spawn instead of fork, forking a process that already initialized torch is not safe
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        yield from tqdm.tqdm(pool.imap_unordered(_transcribe, pending), total=len(pending))
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--model-size', type=str, default='large')
     parser.add_argument('--playlist-directory', type=str, default='.')
-    parser.add_argument('--window-size', type=int, default=6)
+    parser.add_argument('--window-size', type=int, default=6,
+                        help='number of segments following the first one in every window')
+    window_step = parser.add_mutually_exclusive_group()
+    window_step.add_argument('--stride', type=int, default=None,
+                             help='number of segments between the starts of two windows (default 1)')
+    window_step.add_argument('--overlap', type=int, default=None,
+                             help='number of segments two consecutive windows share')
+    parser.add_argument('--library-directory', type=str, default=None,
+                        help='where the library is written, defaults to PLAYLIST_DIRECTORY/library')
+    parser.add_argument('--format', type=str, choices=['parquet', 'jsonl'], default=None,
+                        help='format of the row shards, parquet if pyarrow is installed and jsonl otherwise')
+    parser.add_argument('--excel', action='store_true',
+                        help='additionally export the library to PLAYLIST_DIRECTORY/semantha_library.xlsx')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes, each with its own copy of the model')
+    parser.add_argument('--checkpoint-directory', type=str, default=None,
+                        help='where finished transcripts are kept, defaults to PLAYLIST_DIRECTORY/.transcripts')
+    parser.add_argument('--backend', type=str, choices=list(BACKENDS), default='whisper',
+                        help='faster-whisper runs an int8 model on the CPU (pip install faster-whisper)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='CPU threads per worker, defaults to the number of cores divided by the workers')
+    parser.add_argument('--vad', action='store_true',
+                        help='only transcribe the speech, detected on audio decoded once to a 16 kHz cache')
+    parser.add_argument('--batch-size', type=int, default=8,
+                        help='number of 30 second speech chunks decoded at once with --vad')
+    parser.add_argument('--audio-cache', type=str, default=None,
+                        help='where --vad keeps the decoded audio, defaults to PLAYLIST_DIRECTORY/.audio')
     args = parser.parse_args()
 
     # Load playlist
     playlist = Playlist(args.playlist_directory)
+    for video in playlist:
+        video["hash"] = content_hash(video["mp3"])
+    variant = ("" if args.backend == "whisper" else f"_{args.backend}") + ("_vad" if args.vad else "")
+    checkpoints = Checkpoints(
+        args.checkpoint_directory or os.path.join(args.playlist_directory, ".transcripts"), args.model_size, variant
+    )
+    vad = None
+    if args.vad:
+        vad = {
+            "audio_cache": args.audio_cache or os.path.join(args.playlist_directory, ".audio"),
+            "batch_size": args.batch_size,
+        }
+
+    if args.overlap is not None:
+        stride = args.window_size + 1 - args.overlap
+    else:
+        stride = args.stride or 1
+    if stride < 1:
+        parser.error('the overlap has to be smaller than the window')
 
-    # Load model
+    library_directory = args.library_directory or os.path.join(args.playlist_directory, 'library')
+    writer = LibraryWriter(library_directory, args.format)
+    writer.write_videos(playlist)
+
+    # Transcribe everything that has no checkpoint yet, rows are written as soon as a video is done
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    if not device == 'cuda':
-        print('WARNING: CUDA is not available. This will be very slow.')
-    model = whisper.load_model(args.model_size, device=device)
-
-    # Process playlist
-    library = []
-    for video in tqdm.tqdm(playlist, total=len(playlist)):
-        # One entry for the whole transcript
-        transcript = model.transcribe(audio=video["mp3"])
-        library.append({
-            "Name": video["title"],
-            "Content": transcript["text"],
-            "Metadata": {
-                "url": video["url"],
-                "description": video["description"],
-                "tags": video["tags"]
-            },
-            "Tags": f"TRANSCRIPT, {video['playlist']}"
-        })
-
-        # Followed by an entry for all args.window_size consecutive segments
-        for start in range(len(transcript["segments"])):
-            end = min(len(transcript["segments"]) - 1, start + args.window_size)
-            library.append({
-                'Name': video["title"],
-                "Content": " ".join(map(lambda s: s["text"], transcript["segments"][start:end + 1])),
-                "Metadata": {
-                    "url": f"{video['url']}&t={int(transcript['segments'][start]['start'])}s",
-                    "description": video["description"],
-                    "tags": video["tags"]
-                },
-                "Tags": f"SEGMENT, {video['playlist']}"
-            })
+    if not device == 'cuda' and args.backend == 'whisper':
+        print('WARNING: CUDA is not available. This will be very slow, consider --backend faster-whisper.')
+    for video in transcribe_playlist(playlist, checkpoints, args.model_size, device, args.workers, vad,
+                                     args.backend, args.threads):
+        writer.write_rows(video, build_rows(video, checkpoints.load(video), args.window_size, stride))
+    writer.remove_stale_rows(playlist)
+    print(f"Wrote library to {library_directory}")
 
-    pd.DataFrame(library).to_excel(f"{os.path.join(args.playlist_directory, 'semantha_library')}.xlsx")
-    print(f"Wrote output to {os.path.join(args.playlist_directory, 'semantha_library')}.xlsx")
+    if args.excel:
+        import pandas as pd
+        excel_path = f"{os.path.join(args.playlist_directory, 'semantha_library')}.xlsx"
+        pd.DataFrame(read_library(library_directory)).to_excel(excel_path)
+        print(f"Wrote output to {excel_path}")